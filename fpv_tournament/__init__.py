@@ -0,0 +1,42 @@
+"""Ядро турнирной системы без интерфейса: БД, сетка, квалификация, плей-офф, итоги,
+резервные копии и экспорт. Импортируется скриптами и бенчмарками без запуска Streamlit;
+app.py — только интерфейс поверх этого пакета."""
+from .database import (
+    SQLITE_PRAGMAS, db, connection, exclusive_access, close_all_connections, set_db_path, transaction,
+    clear_request_memo, request_memo, db_generation_token, node_versions, SHARED_CACHE_SIZE, shared_cache,
+    qdf, q_rows, q_one, q_scalar, exec_sql, exec_many
+)
+from .schema import DATA_TABLES, MIGRATIONS, SCHEMA_VERSION, CHANGE_LOG_RETAIN, init_db
+from .dependencies import qualification_nodes, dsq_nodes, stage_nodes, tournament_nodes
+from .changes import latest_change_seq, changes_since, compact_change_log
+from .bracket import (
+    SEEDING_1_8_32, SEEDING_1_4_16, SEEDING_1_2_8, SEEDING_FINAL_4, PROGRESS_1_8_TO_1_4,
+    PROGRESS_1_4_TO_1_2, PROGRESS_1_2_TO_FINAL, FINAL_SCORING, SIM_SCORING, StageDef,
+    compute_bracket_size, generate_bracket, bracket_to_json, bracket_from_json
+)
+from .i18n import I18N, translate
+from .ranking import TIE_ORDER, TIE_SHARED, rank_frame, tie_groups
+from .qualification import (
+    calc_projected_time, safe_time_for_input, rank_results, get_qualification_results,
+    get_participant_qual_attempts, get_qual_ranking, save_qual_result, participant_count,
+    get_disqualified_pids, get_tournament, format_time, parse_time
+)
+from .playoff import (
+    set_participant_disqualified, delete_participant, get_all_stages, get_active_stage, create_stage, seed_groups_from_qual,
+    get_group_members, get_groups_for_stages, get_all_groups, save_heat, get_heat_results,
+    compute_group_ranking, compute_stage_rankings, get_group_standings, compute_final_standings,
+    detect_final_ties, compute_sim_group_ranking, get_sim_track_bests, get_stage_sim_track_bests, detect_sim_group_ties,
+    find_cutoff_ties, resolve_sim_tiebreaker, compute_sim_final_standings, get_stage_heat_counts,
+    required_heats, refresh_group_progress, refresh_stage_progress, refresh_participant_progress,
+    get_stage_progress, get_stage_progress_summary, get_missing_heats, check_stage_results_complete,
+    advance_to_next_stage, delete_stages, delete_tournament, rollback_to_previous_stage, start_bracket,
+    finish_tournament, get_bracket_for_tournament, save_bracket, rederive_bracket, derive_bracket
+)
+from .standings import compute_overall_standings, refresh_tournament_standings
+from .backup import (
+    BACKUP_PAGES_PER_STEP, BACKUP_CHUNK_SIZE, BACKUP_MAX_AGE_SECONDS, backup_database, make_backup_file,
+    read_backup_file, sweep_backup_files, stage_upload, remove_staged, import_database,
+    list_file_tournaments, merge_tournaments_from_file
+)
+from .excel_import import parse_excel_discipline_list
+from .export import export_tournament_excel
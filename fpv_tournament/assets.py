@@ -0,0 +1,202 @@
+"""Стили интерфейса."""
+
+BASE_CSS = """
+<style>
+.tournament-progress {
+    display: flex;
+    align-items: flex-start;
+    margin: 20px 0;
+    position: relative;
+    padding: 0 10px;
+}
+.progress-step {
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    flex: 1;
+    position: relative;
+    z-index: 1;
+}
+.progress-step:not(:last-child)::after {
+    content: '';
+    position: absolute;
+    top: 14px;
+    left: 50%;
+    width: 100%;
+    height: 3px;
+    background: #3a3a3a;
+    z-index: 0;
+}
+.progress-step.completed:not(:last-child)::after {
+    background: #4CAF50;
+}
+.progress-step.active:not(:last-child)::after {
+    background: linear-gradient(90deg, #667eea 0%, #3a3a3a 100%);
+}
+.progress-dot {
+    width: 28px;
+    height: 28px;
+    border-radius: 50%;
+    background: #3a3a3a;
+    border: 3px solid #555;
+    z-index: 2;
+    position: relative;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    font-size: 12px;
+}
+.progress-step.completed .progress-dot {
+    background: #4CAF50;
+    border-color: #45a049;
+    box-shadow: 0 0 8px rgba(76, 175, 80, 0.5);
+}
+.progress-step.active .progress-dot {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    border-color: #667eea;
+    box-shadow: 0 0 12px rgba(102, 126, 234, 0.6);
+    animation: pulse-dot 2s infinite;
+}
+@keyframes pulse-dot {
+    0%, 100% { box-shadow: 0 0 8px rgba(102, 126, 234, 0.4); }
+    50% { box-shadow: 0 0 16px rgba(102, 126, 234, 0.8); }
+}
+.progress-step.pending .progress-dot {
+    background: #2a2a2a;
+    border-color: #444;
+}
+.progress-label {
+    margin-top: 8px;
+    font-size: 0.75em;
+    font-weight: 500;
+    text-align: center;
+    max-width: 90px;
+    line-height: 1.2;
+    color: #888;
+}
+.progress-step.completed .progress-label {
+    color: #4CAF50;
+}
+.progress-step.active .progress-label {
+    color: #667eea;
+    font-weight: 700;
+}
+/* Bracket tree */
+.bracket-container {
+    display: flex;
+    align-items: center;
+    gap: 0;
+    overflow-x: auto;
+    padding: 20px 0;
+}
+.bracket-round-wrapper {
+    display: flex;
+    flex-direction: column;
+    align-items: stretch;
+    flex-shrink: 0;
+}
+.bracket-round-title {
+    text-align: center;
+    font-weight: 700;
+    font-size: 1em;
+    margin-bottom: 8px;
+    padding: 6px 12px;
+    border-radius: 8px;
+    background: #2a2a2a;
+    color: #ccc;
+}
+.bracket-round-title.active-round {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+}
+.bracket-round-title.done-round {
+    background: #2e7d32;
+    color: #90EE90;
+}
+.bracket-round-title.final-round {
+    background: linear-gradient(135deg, #d4a017 0%, #b8860b 100%);
+    color: white;
+}
+.bracket-groups-row {
+    display: flex;
+    align-items: stretch;
+}
+.bracket-groups-col {
+    display: flex;
+    flex-direction: column;
+    justify-content: center;
+    min-width: 280px;
+    max-width: 340px;
+}
+.bracket-group {
+    background: #1e1e1e;
+    border: 1px solid #444;
+    border-radius: 8px;
+    margin: 6px 0;
+    padding: 8px 10px;
+}
+.bracket-group-title {
+    font-size: 0.78em;
+    color: #888;
+    margin-bottom: 4px;
+    text-align: center;
+    font-weight: 600;
+}
+.bracket-player {
+    display: flex;
+    justify-content: space-between;
+    padding: 4px 8px;
+    font-size: 0.85em;
+    border-radius: 4px;
+    margin: 2px 0;
+    gap: 12px;
+}
+.bracket-player.advancing {
+    background: #1a3a1a;
+    color: #90EE90;
+}
+.bracket-player.eliminated {
+    background: #3a1a1a;
+    color: #FFB6B6;
+}
+.bracket-player.gold {
+    background: #5C4B00;
+    color: #FFD700;
+    font-weight: 700;
+}
+.bracket-player.silver {
+    background: #3A3A3A;
+    color: #C0C0C0;
+}
+.bracket-player.bronze {
+    background: #3D2B1F;
+    color: #CD7F32;
+}
+.bracket-player.pending-player {
+    color: #666;
+}
+.bracket-connector {
+    display: flex;
+    flex-direction: column;
+    justify-content: center;
+    width: 60px;
+    min-width: 60px;
+    flex-shrink: 0;
+    margin-right: 10px;
+}
+.bracket-conn-top {
+    flex: 1;
+    border-right: 2px solid #555;
+    border-top: 2px solid #555;
+    margin-left: 40%;
+    min-height: 10px;
+}
+.bracket-conn-bottom {
+    flex: 1;
+    border-right: 2px solid #555;
+    border-bottom: 2px solid #555;
+    margin-left: 40%;
+    min-height: 10px;
+}
+</style>
+"""
@@ -0,0 +1,248 @@
+"""Резервная копия, импорт и слияние БД."""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from . import database
+from .database import (
+    close_all_connections, connection, exclusive_access, exec_sql, q_rows, q_scalar, transaction
+)
+from .schema import SCHEMA_VERSION, _run_migrations, _schema_version, _table_columns
+from .playoff import refresh_stage_progress
+
+
+# Страниц за шаг backup API (между шагами запись в БД не блокируется) и блок копирования при сжатии gzip
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_CHUNK_SIZE = 1024 * 1024
+
+
+# Подготовленные копии лежат во временном каталоге; не скачанные удаляются по возрасту
+BACKUP_FILE_PREFIX = "tournament_backup_"
+BACKUP_MAX_AGE_SECONDS = 3600
+
+
+def backup_database(dest_path: str, compress: bool = False) -> str:
+    """Согласованный снимок БД в dest_path через sqlite3 backup API (по частям,
+    параллельно с записью). compress=True — файл сжимается gzip. Возвращает dest_path."""
+    raw_path = dest_path + "-raw" if compress else dest_path
+    src = sqlite3.connect(database.DB_PATH, timeout=5.0)
+    dst = sqlite3.connect(raw_path)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP)
+        # Копия — один самодостаточный файл, без -wal
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    if compress:
+        try:
+            with open(raw_path, "rb") as fin, gzip.open(dest_path, "wb") as fout:
+                shutil.copyfileobj(fin, fout, BACKUP_CHUNK_SIZE)
+        finally:
+            os.remove(raw_path)
+    return dest_path
+
+
+def make_backup_file(compress: bool = False) -> str:
+    """Снимок БД во временный файл (удаляет вызывающий; забытые — sweep_backup_files)."""
+    fd, path = tempfile.mkstemp(prefix=BACKUP_FILE_PREFIX, suffix=".db.gz" if compress else ".db")
+    os.close(fd)
+    try:
+        return backup_database(path, compress)
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def read_backup_file(path: str) -> bytes:
+    """Содержимое подготовленной копии для скачивания; файл удаляется после чтения."""
+    with open(path, "rb") as f:
+        data = f.read()
+    os.remove(path)
+    return data
+
+
+def sweep_backup_files(max_age: float = BACKUP_MAX_AGE_SECONDS) -> int:
+    """Удаляет подготовленные копии старше max_age секунд (сессия закрыта, копию не скачали).
+    Возвращает число удалённых файлов."""
+    removed = 0
+    cutoff = time.time() - max_age
+    tmp_dir = tempfile.gettempdir()
+    for name in os.listdir(tmp_dir):
+        if not name.startswith(BACKUP_FILE_PREFIX):
+            continue
+        path = os.path.join(tmp_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass  # файл уже удалила другая сессия
+    return removed
+
+
+def _validate_import(path: str):
+    """Проверяет подготовленный файл и доводит его схему до SCHEMA_VERSION.
+    ValueError — файл нельзя импортировать (текущая БД не тронута)."""
+    try:
+        conn = sqlite3.connect(path)
+    except sqlite3.Error as e:
+        raise ValueError(f"Файл не открывается как БД SQLite: {e}")
+    try:
+        try:
+            integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Файл не является корректной базой данных: {e}")
+        if integrity != "ok":
+            raise ValueError(f"Проверка целостности не пройдена: {integrity}")
+        version = _schema_version(conn)
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"БД создана более новой версией приложения (схема {version}, "
+                             f"поддерживается до {SCHEMA_VERSION})")
+        if "tournaments" not in {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}:
+            raise ValueError("В файле нет таблиц турниров")
+        if version < SCHEMA_VERSION:
+            conn.execute("PRAGMA foreign_keys=OFF")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                _run_migrations(conn)
+            except sqlite3.Error as e:
+                conn.rollback()
+                raise ValueError(f"Не удалось обновить схему БД: {e}")
+            conn.commit()
+        # Файл встанет на место DB_PATH целиком — без собственного -wal
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+
+
+def stage_upload(source) -> str:
+    """Копирует файловый объект source (.db или .db.gz) частями во временный файл
+    рядом с БД, проверяет и мигрирует его. Возвращает путь (удаляет вызывающий
+    через remove_staged). ValueError — файл нельзя импортировать."""
+    db_dir = os.path.dirname(os.path.abspath(database.DB_PATH))
+    fd, staged = tempfile.mkstemp(prefix=".import_", suffix=".db", dir=db_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            head = source.read(2)
+            if head == b"\x1f\x8b":
+                source.seek(0)
+                source = gzip.GzipFile(fileobj=source, mode="rb")
+            else:
+                out.write(head)
+            try:
+                shutil.copyfileobj(source, out, BACKUP_CHUNK_SIZE)
+            except (OSError, EOFError) as e:
+                raise ValueError(f"Не удалось распаковать архив: {e}")
+        _validate_import(staged)
+    except BaseException:
+        remove_staged(staged)
+        raise
+    return staged
+
+
+def remove_staged(path: str):
+    for leftover in (path, path + "-wal", path + "-shm", path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def import_database(source) -> None:
+    """Заменяет БД содержимым файлового объекта source (.db или .db.gz).
+    Файл проверяется и мигрируется во временной копии (stage_upload) и атомарно
+    подменяет DB_PATH. При ошибке проверки — ValueError, текущая БД не изменяется."""
+    staged = stage_upload(source)
+    try:
+        # Замена ждёт, пока другие сессии закончат текущие запросы и транзакции, и не пускает
+        # новые до её окончания. Соединения пула закрываются (последнее закрытие сбрасывает
+        # WAL); остатки -wal/-shm старой БД нельзя применять к новому файлу
+        with exclusive_access():
+            close_all_connections()
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(database.DB_PATH + suffix):
+                    os.remove(database.DB_PATH + suffix)
+            os.replace(staged, database.DB_PATH)
+    finally:
+        remove_staged(staged)
+
+
+def list_file_tournaments(path: str) -> pd.DataFrame:
+    """Турниры в подготовленном файле (stage_upload)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query("""SELECT id, name, discipline, status, created_at,
+                                           (SELECT COUNT(*) FROM participants p WHERE p.tournament_id=tournaments.id)
+                                               as participants
+                                    FROM tournaments ORDER BY id""", conn)
+    finally:
+        conn.close()
+
+
+# Таблицы в порядке вставки (родители раньше детей) и отбор строк выбранных
+# турниров в присоединённой БД src; {ids} — плейсхолдеры id турниров.
+_MERGE_TABLES = [
+    ("tournaments", "id IN ({ids})"),
+    ("participants", "tournament_id IN ({ids})"),
+    ("team_pilots", "participant_id IN (SELECT id FROM src.participants WHERE tournament_id IN ({ids}))"),
+    ("qualification_results", "tournament_id IN ({ids})"),
+    ("stages", "tournament_id IN ({ids})"),
+    ("groups", "stage_id IN (SELECT id FROM src.stages WHERE tournament_id IN ({ids}))"),
+    ("group_members", """group_id IN (SELECT g.id FROM src.groups g JOIN src.stages s ON s.id=g.stage_id
+                                     WHERE s.tournament_id IN ({ids}))"""),
+    ("heats", """group_id IN (SELECT g.id FROM src.groups g JOIN src.stages s ON s.id=g.stage_id
+                             WHERE s.tournament_id IN ({ids}))"""),
+    ("heat_results", """heat_id IN (SELECT h.id FROM src.heats h JOIN src.groups g ON g.id=h.group_id
+                                   JOIN src.stages s ON s.id=g.stage_id WHERE s.tournament_id IN ({ids}))"""),
+]
+
+
+# Столбцы-ссылки и таблица, на id которой они указывают
+_MERGE_ID_REFS = {"tournament_id": "tournaments", "participant_id": "participants",
+                  "stage_id": "stages", "group_id": "groups", "heat_id": "heats"}
+
+
+def _id_offset(table: str) -> int:
+    """Сдвиг id для вставляемых строк: больше любого использованного id (с учётом AUTOINCREMENT)."""
+    return int(q_scalar("""SELECT MAX(COALESCE((SELECT MAX(id) FROM {table}), 0),
+                                  COALESCE((SELECT seq FROM sqlite_sequence WHERE name=?), 0))""".format(table=table),
+                        (table,), default=0))
+
+
+def merge_tournaments_from_file(path: str, tournament_ids: List[int]) -> Dict[str, int]:
+    """Добавляет выбранные турниры из подготовленного файла (stage_upload) в текущую БД.
+    Файл присоединяется через ATTACH, строки переносятся INSERT ... SELECT с пересчётом
+    id (сдвигом) одной транзакцией. Возвращает {таблица: добавлено строк}."""
+    tournament_ids = [int(t) for t in tournament_ids]
+    if not tournament_ids:
+        return {}
+    ids = ",".join("?" * len(tournament_ids))
+    with connection() as conn:
+        # ATTACH недоступен внутри транзакции
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        try:
+            with transaction():
+                offsets = {table: _id_offset(table) for table, _ in _MERGE_TABLES
+                           if "id" in _table_columns(conn, table)}
+                added = {}
+                for table, where in _MERGE_TABLES:
+                    cols = _table_columns(conn, table)
+                    exprs = []
+                    for col in cols:
+                        ref = table if col == "id" else _MERGE_ID_REFS.get(col)
+                        exprs.append(f"{col} + {offsets[ref]}" if ref else col)
+                    added[table] = exec_sql(
+                        "INSERT INTO {table}({cols}) SELECT {exprs} FROM src.{table} WHERE {where}".format(
+                            table=table, cols=", ".join(cols), exprs=", ".join(exprs), where=where.format(ids=ids)),
+                        tournament_ids)
+                # Прогресс групп выводится из данных — считаем заново для новых этапов
+                for r in q_rows("SELECT id FROM src.stages WHERE tournament_id IN ({})".format(ids), tournament_ids):
+                    refresh_stage_progress(int(r["id"]) + offsets["stages"])
+        finally:
+            conn.execute("DETACH DATABASE src")
+    return added
@@ -0,0 +1,139 @@
+"""Таблицы посева и прогресса регламента, описание этапов (StageDef) и генерация сетки."""
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional
+
+
+# Посев 32 → 1/8 (Таблица №3)
+SEEDING_1_8_32: Dict[int, List[int]] = {
+    1: [1, 9, 24, 32], 2: [8, 16, 17, 25], 3: [7, 15, 18, 26], 4: [6, 14, 19, 27],
+    5: [5, 13, 20, 28], 6: [4, 12, 21, 29], 7: [3, 11, 22, 30], 8: [2, 10, 23, 31],
+}
+
+
+# Посев 16 → 1/4 (Таблица №4)
+SEEDING_1_4_16: Dict[int, List[int]] = {
+    1: [1, 5, 12, 16], 2: [3, 7, 10, 14], 3: [2, 6, 11, 15], 4: [4, 8, 9, 13],
+}
+
+
+# Посев 8 → 1/2 (аналогичная схема змейкой)
+SEEDING_1_2_8: Dict[int, List[int]] = {
+    1: [1, 4, 5, 8], 2: [2, 3, 6, 7],
+}
+
+
+# Посев 4 → Финал
+SEEDING_FINAL_4: Dict[int, List[int]] = {
+    1: [1, 2, 3, 4],
+}
+
+
+# Пересев 1/8 → 1/4
+PROGRESS_1_8_TO_1_4: Dict[int, List[Tuple[int, int]]] = {
+    1: [(1, 1), (1, 5), (2, 6), (2, 2)],
+    2: [(1, 7), (1, 3), (2, 8), (2, 4)],
+    3: [(1, 8), (1, 4), (2, 7), (2, 3)],
+    4: [(1, 6), (1, 2), (2, 1), (2, 5)],
+}
+
+
+# Пересев 1/4 → 1/2
+PROGRESS_1_4_TO_1_2: Dict[int, List[Tuple[int, int]]] = {
+    1: [(1, 1), (1, 2), (2, 3), (2, 4)],
+    2: [(1, 3), (1, 4), (2, 1), (2, 2)],
+}
+
+
+# Пересев 1/2 → Финал
+PROGRESS_1_2_TO_FINAL: Dict[int, List[Tuple[int, int]]] = {
+    1: [(1, 1), (1, 2), (2, 1), (2, 2)]
+}
+
+
+# Очки финала (дроны)
+FINAL_SCORING = {1: 3, 2: 2, 3: 1, 4: 0}
+
+
+# Очки группового/финального этапа (симулятор)
+# 4 пилота летят одновременно, 2 трассы × 3 попытки = 6 вылетов, сумма очков. Макс 24.
+SIM_SCORING = {1: 4, 2: 3, 3: 2, 4: 1}  # 0 для DNF (не в словаре)
+
+
+@dataclass
+class StageDef:
+    code: str
+    display_name: Dict[str, str]
+    group_size: int
+    group_count: int
+    qualifiers: int
+    heats_count: int = 1  # 3 для финала
+    seeding_map: Optional[Dict[int, List[int]]] = None
+    progress_map: Optional[Dict[int, List[Tuple[int, int]]]] = None
+
+
+def compute_bracket_size(n: int) -> int:
+    """Наибольшая степень 2 <= n (минимум 4)."""
+    for s in [32, 16, 8, 4]:
+        if n >= s:
+            return s
+    return 4
+
+
+def generate_bracket(advancing: int) -> List[StageDef]:
+    """Генерирует список этапов плей-офф по количеству прошедших."""
+    stages: List[StageDef] = []
+    if advancing >= 32:
+        stages.append(StageDef("1/8", {"RU": "1/8 финала", "EN": "Round of 16"}, 4, 8, 2, 1,
+                                seeding_map=SEEDING_1_8_32))
+        stages.append(StageDef("1/4", {"RU": "Четвертьфинал", "EN": "Quarterfinal"}, 4, 4, 2, 1,
+                                progress_map=PROGRESS_1_8_TO_1_4))
+        stages.append(StageDef("1/2", {"RU": "Полуфинал", "EN": "Semifinal"}, 4, 2, 2, 1,
+                                progress_map=PROGRESS_1_4_TO_1_2))
+        stages.append(StageDef("F", {"RU": "ФИНАЛ", "EN": "FINAL"}, 4, 1, 0, 3,
+                                progress_map=PROGRESS_1_2_TO_FINAL))
+    elif advancing >= 16:
+        stages.append(StageDef("1/4", {"RU": "Четвертьфинал", "EN": "Quarterfinal"}, 4, 4, 2, 1,
+                                seeding_map=SEEDING_1_4_16))
+        stages.append(StageDef("1/2", {"RU": "Полуфинал", "EN": "Semifinal"}, 4, 2, 2, 1,
+                                progress_map=PROGRESS_1_4_TO_1_2))
+        stages.append(StageDef("F", {"RU": "ФИНАЛ", "EN": "FINAL"}, 4, 1, 0, 3,
+                                progress_map=PROGRESS_1_2_TO_FINAL))
+    elif advancing >= 8:
+        stages.append(StageDef("1/2", {"RU": "Полуфинал", "EN": "Semifinal"}, 4, 2, 2, 1,
+                                seeding_map=SEEDING_1_2_8))
+        stages.append(StageDef("F", {"RU": "ФИНАЛ", "EN": "FINAL"}, 4, 1, 0, 3,
+                                progress_map=PROGRESS_1_2_TO_FINAL))
+    else:  # 4
+        stages.append(StageDef("F", {"RU": "ФИНАЛ", "EN": "FINAL"}, 4, 1, 0, 3,
+                                seeding_map=SEEDING_FINAL_4))
+    return stages
+
+
+def bracket_to_json(bracket: List[StageDef]) -> str:
+    """Сериализация сетки для хранения в tournaments.bracket_json."""
+    return json.dumps([{
+        "code": sd.code,
+        "display_name": sd.display_name,
+        "group_size": sd.group_size,
+        "group_count": sd.group_count,
+        "qualifiers": sd.qualifiers,
+        "heats_count": sd.heats_count,
+        "seeding_map": sd.seeding_map,
+        "progress_map": sd.progress_map,
+    } for sd in bracket], ensure_ascii=False)
+
+
+def bracket_from_json(data: str) -> List[StageDef]:
+    """Обратное к bracket_to_json: ключи групп снова int, ссылки (место, группа) — кортежи."""
+    bracket = []
+    for d in json.loads(data):
+        seeding = d.get("seeding_map")
+        progress = d.get("progress_map")
+        bracket.append(StageDef(
+            d["code"], d["display_name"], d["group_size"], d["group_count"],
+            d["qualifiers"], d.get("heats_count", 1),
+            seeding_map={int(k): list(v) for k, v in seeding.items()} if seeding else None,
+            progress_map={int(k): [tuple(ref) for ref in v] for k, v in progress.items()} if progress else None,
+        ))
+    return bracket
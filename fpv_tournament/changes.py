@@ -0,0 +1,42 @@
+"""Журнал изменений (change_log): чтение «что поменялось после seq» и ручное сжатие."""
+from typing import Dict, List, Optional
+
+from .database import exec_sql, q_rows, q_scalar, transaction
+from .schema import CHANGE_LOG_RETAIN
+
+
+def latest_change_seq() -> int:
+    """Номер последней записи журнала (0 — изменений ещё не было). Стартовая точка потребителя."""
+    return int(q_scalar("SELECT seq FROM sqlite_sequence WHERE name='change_log'", default=0))
+
+
+def changes_since(seq: int, tournament_id: Optional[int] = None,
+                  limit: Optional[int] = None) -> Optional[List[Dict]]:
+    """Изменения с номером больше seq по возрастанию: [{seq, table_name, tournament_id, row_key, op}].
+    op — 'I'/'U'/'D'; tournament_id ограничивает выборку одним турниром.
+    None — журнал после seq уже сжат: потребителю нужно перечитать данные целиком.
+    После импорта БД номера относятся к другому файлу — сверяйте db_generation_token()."""
+    if seq < int(q_scalar("SELECT seq FROM change_log_floor WHERE id = 1", default=0)):
+        return None
+    sql = "SELECT seq, table_name, tournament_id, row_key, op FROM change_log WHERE seq > ?"
+    params: list = [seq]
+    if tournament_id is not None:
+        sql += " AND tournament_id = ?"
+        params.append(tournament_id)
+    sql += " ORDER BY seq"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [dict(r) for r in q_rows(sql, tuple(params))]
+
+
+def compact_change_log(retain: int = CHANGE_LOG_RETAIN) -> int:
+    """Сжимает журнал: оставляет последнюю запись по каждой строке (таблица, ключ) и не более
+    retain последних записей. Возвращает число удалённых записей."""
+    with transaction():
+        removed = exec_sql("""DELETE FROM change_log WHERE seq NOT IN (
+                                  SELECT MAX(seq) FROM change_log GROUP BY table_name, row_key)""")
+        floor = latest_change_seq() - retain
+        removed += exec_sql("DELETE FROM change_log WHERE seq <= ?", (floor,))
+        exec_sql("UPDATE change_log_floor SET seq = MAX(seq, ?) WHERE id = 1", (floor,))
+    return removed
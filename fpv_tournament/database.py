@@ -0,0 +1,335 @@
+"""Соединения с SQLite: пул по потокам, транзакции, кэши чтения и хелперы запросов."""
+import copy
+import functools
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple, Optional
+
+import pandas as pd
+
+
+DB_PATH = "tournament.db"
+
+# Настройки соединения: WAL позволяет читать во время записи, NORMAL — fsync только на checkpoint
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",     # ~16 МБ страничного кэша
+    "PRAGMA mmap_size = 67108864",    # 64 МБ memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+# Пул соединений: у каждого потока своё соединение, открытое один раз.
+# Streamlit выполняет каждый rerun в новом потоке, поэтому соединения завершившихся
+# потоков не закрываются, а возвращаются в пул и переиспользуются следующим rerun'ом.
+# Пул хранится в импортируемом модуле: app.py Streamlit исполняет заново в новом
+# пространстве имён на каждом rerun, и глобальные переменные там не переживают rerun.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool_owned: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+_pool_idle: List[sqlite3.Connection] = []
+_pool_generation = 0
+
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, check_same_thread=False)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def db() -> sqlite3.Connection:
+    """Соединение текущего потока из пула (WAL, настроенные PRAGMA). Запросы выполняются
+    внутри connection(), иначе импорт БД может закрыть соединение посреди запроса."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "generation", None) == _pool_generation:
+        return conn
+    with _pool_lock:
+        # Забираем соединения потоков, которые уже завершились
+        for ident, (thread, c) in list(_pool_owned.items()):
+            if not thread.is_alive():
+                del _pool_owned[ident]
+                if c.in_transaction:
+                    c.rollback()
+                _pool_idle.append(c)
+        conn = _pool_idle.pop() if _pool_idle else _open_connection()
+        _pool_owned[threading.get_ident()] = (threading.current_thread(), conn)
+        _local.generation = _pool_generation
+    _local.conn = conn
+    return conn
+
+
+# Шлюз доступа к БД: каждый запрос и каждый transaction() держат «пользование» (вложенные —
+# одно на поток), замена файла БД (импорт, set_db_path) берёт исключительный доступ: ждёт
+# окончания текущих пользований и не пускает новые, пока файл не заменён.
+_gate = threading.Condition()
+_gate_users = 0
+_gate_owner: Optional[int] = None
+
+
+@contextmanager
+def connection():
+    """Соединение текущего потока на время блока. Пока блок открыт, файл БД не заменяется."""
+    global _gate_users
+    depth = getattr(_local, "use_depth", 0)
+    if depth == 0 and _gate_owner != threading.get_ident():
+        with _gate:
+            while _gate_owner is not None:
+                _gate.wait()
+            _gate_users += 1
+        entered = True
+    else:
+        entered = False
+    _local.use_depth = depth + 1
+    try:
+        yield db()
+    finally:
+        _local.use_depth = depth
+        if entered:
+            with _gate:
+                _gate_users -= 1
+                _gate.notify_all()
+
+
+@contextmanager
+def exclusive_access():
+    """Исключительный доступ к БД: дожидается завершения запросов и транзакций других потоков
+    и блокирует новые до выхода из блока. Внутри connection() того же потока — RuntimeError."""
+    global _gate_owner
+    me = threading.get_ident()
+    if _gate_owner == me:
+        yield
+        return
+    if getattr(_local, "use_depth", 0):
+        raise RuntimeError("Исключительный доступ к БД нельзя получить внутри запроса или транзакции")
+    with _gate:
+        while _gate_owner is not None:
+            _gate.wait()
+        _gate_owner = me
+        while _gate_users:
+            _gate.wait()
+    try:
+        yield
+    finally:
+        with _gate:
+            _gate_owner = None
+            _gate.notify_all()
+
+
+def close_all_connections():
+    """Закрывает все соединения пула (перед заменой файла БД). Ждёт, пока другие потоки
+    закончат текущие запросы и транзакции; их соединения — уже простаивающие — закрываются,
+    и при следующем db() потоки откроют новые, а их кэш запроса будет сброшен."""
+    with exclusive_access():
+        _close_pool()
+
+
+def _close_pool():
+    global _pool_generation
+    with _pool_lock:
+        conns = [c for _, c in _pool_owned.values()] + _pool_idle
+        _pool_owned.clear()
+        _pool_idle.clear()
+        _pool_generation += 1
+    for c in conns:
+        try:
+            c.close()
+        except sqlite3.Error:
+            pass
+    _local.conn = None
+    clear_request_memo()
+    with _shared_cache_lock:
+        _shared_cache.clear()
+
+
+def set_db_path(path: str):
+    """Переключает работу на другой файл БД (скрипты, бенчмарки). Соединения пула закрываются."""
+    global DB_PATH
+    with exclusive_access():
+        _close_pool()
+        DB_PATH = path
+
+
+def _in_transaction() -> bool:
+    return getattr(_local, "tx_depth", 0) > 0
+
+
+@contextmanager
+def transaction():
+    """Единица работы: все записи внутри блока — одна транзакция и один commit.
+    Вложенные блоки становятся SAVEPOINT'ами внешней транзакции; при исключении
+    откатывается только свой уровень, исключение пробрасывается дальше."""
+    with connection() as conn:
+        depth = getattr(_local, "tx_depth", 0)
+        savepoint = f"sp_{depth}"
+        conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT {savepoint}")
+        _local.tx_depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            _local.tx_depth = depth
+            if depth == 0:
+                conn.rollback()
+            else:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            clear_request_memo()  # закэшированное внутри блока могло видеть откаченные записи
+            raise
+        _local.tx_depth = depth
+        if depth == 0:
+            conn.commit()
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+
+
+# Мемоизация на один rerun: тяжёлые чтения (рейтинги, этапы, DSQ) вызываются из многих
+# мест за один проход скрипта. Кэш живёт в потоке, сбрасывается в начале каждого rerun
+# и после любой записи через exec_sql / exec_many / transaction(), а также после замены
+# файла БД другим потоком (поколение пула в кэше не совпадает с текущим).
+def clear_request_memo():
+    _local.memo = {}
+    _local.memo_generation = _pool_generation
+
+
+def _memo_copy(value):
+    # Неизменяемые значения (frozenset DSQ, байты отчёта) отдаются без копии
+    if isinstance(value, (frozenset, bytes, str, int, float, type(None))):
+        return value
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+def request_memo(func):
+    """Кэширует результат функции до следующей записи в БД или следующего rerun.
+    Вызывающему отдаётся копия, чтобы изменения не попадали в кэш."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        memo = getattr(_local, "memo", None)
+        if memo is None or getattr(_local, "memo_generation", None) != _pool_generation:
+            clear_request_memo()
+            memo = _local.memo
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in memo:
+            memo[key] = func(*args, **kwargs)
+        return _memo_copy(memo[key])
+    return wrapper
+
+
+@request_memo
+def db_generation_token() -> int:
+    """Токен БД: случайное значение, заданное при её создании. Отличает разные файлы
+    (например, после импорта), сами записи его больше не меняют."""
+    with connection() as conn:
+        return int(conn.execute("SELECT token FROM db_generation WHERE id = 1").fetchone()[0])
+
+
+@request_memo
+def node_versions(nodes: Tuple[str, ...]) -> Tuple[Optional[int], ...]:
+    """Текущие версии узлов графа зависимостей (см. dependencies.py) в порядке nodes.
+    Узел без записи ещё не менялся — версия None."""
+    if not nodes:
+        return ()
+    with connection() as conn:
+        rows = conn.execute("SELECT node, version FROM node_versions WHERE node IN ({})".format(
+            ",".join("?" * len(nodes))), nodes).fetchall()
+    found = {r[0]: r[1] for r in rows}
+    return tuple(found.get(n) for n in nodes)
+
+
+# Кэш между сессиями: одинаковые рейтинги для всех открытых экранов считаются один раз.
+# Ключ включает версии узлов, от которых зависит результат: запись в одну группу
+# сбрасывает только значения этого этапа и турнира, а не весь кэш. Как и пул, кэш
+# определён здесь, а не в app.py, иначе каждый rerun начинал бы с пустого кэша.
+SHARED_CACHE_SIZE = 256
+_shared_cache: "OrderedDict[tuple, object]" = OrderedDict()
+_shared_cache_lock = threading.Lock()
+
+
+def shared_cache(depends_on: Callable[..., List[str]]):
+    """LRU-кэш результата, общий для всех сессий процесса. depends_on(*args, **kwargs) —
+    узлы графа зависимостей, чьи версии входят в ключ. Внутри незавершённой транзакции не используется."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _in_transaction():
+                return func(*args, **kwargs)
+            nodes = tuple(depends_on(*args, **kwargs))
+            key = (DB_PATH, db_generation_token(), func.__name__, args, tuple(sorted(kwargs.items())),
+                   node_versions(nodes))
+            with _shared_cache_lock:
+                found = key in _shared_cache
+                if found:
+                    _shared_cache.move_to_end(key)
+                    value = _shared_cache[key]
+            if not found:
+                value = func(*args, **kwargs)
+                with _shared_cache_lock:
+                    _shared_cache[key] = value
+                    while len(_shared_cache) > SHARED_CACHE_SIZE:
+                        _shared_cache.popitem(last=False)
+            return _memo_copy(value)
+        return wrapper
+    return decorator
+
+
+def qdf(sql, params=()) -> pd.DataFrame:
+    with connection() as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+# Лёгкие чтения без DataFrame: для id, счётчиков и одиночных строк
+def q_rows(sql, params=()) -> List[sqlite3.Row]:
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        return cur.execute(sql, params).fetchall()
+
+
+def q_one(sql, params=()) -> Optional[sqlite3.Row]:
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        return cur.execute(sql, params).fetchone()
+
+
+def q_scalar(sql, params=(), default=None):
+    """Первый столбец первой строки; default, если строк нет или значение NULL."""
+    with connection() as conn:
+        row = conn.execute(sql, params).fetchone()
+    return row[0] if row is not None and row[0] is not None else default
+
+
+def exec_sql(sql, params=()) -> int:
+    """Выполняет запись и возвращает число затронутых строк.
+    Внутри transaction() коммит делает транзакция."""
+    with connection() as conn:
+        clear_request_memo()
+        if _in_transaction():
+            return conn.execute(sql, params).rowcount
+        try:
+            rowcount = conn.execute(sql, params).rowcount
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        return rowcount
+
+
+def exec_many(sql, rows):
+    with connection() as conn:
+        clear_request_memo()
+        if _in_transaction():
+            conn.executemany(sql, rows)
+            return
+        try:
+            conn.executemany(sql, rows)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
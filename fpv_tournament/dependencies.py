@@ -0,0 +1,39 @@
+"""Граф зависимостей производных данных: какие узлы сбрасывает запись и от каких зависит кэш."""
+from typing import List
+
+from .database import q_rows
+
+# Базовые узлы — версии пишут триггеры (schema.NODE_SOURCES) при любой записи в таблицы:
+#   qual:<tid>        участники, пилоты команд, результаты квалификации
+#   tournament:<tid>  настройки турнира, сетка и список этапов
+#   stage:<sid>       группы, составы, вылеты и результаты этапа; DSQ и переименование
+#                     участника сбрасывают только этапы, где он состоял в группах
+#   dsq:<tid>         множество дисквалифицированных турнира (schema.DSQ_NODE_SOURCES)
+#
+# Производные узлы и их источники:
+#   квалификация → посев → этап N → этап N+1 → финал → общий зачёт
+# Посев и переходы между этапами записываются в group_members, поэтому рейтинг этапа
+# зависит только от своего узла stage:<sid>; общий зачёт и отчёт — от всех узлов турнира.
+
+
+def qualification_nodes(tournament_id: int, *_args, **_kwargs) -> List[str]:
+    """Рейтинг квалификации."""
+    return [f"qual:{int(tournament_id)}"]
+
+
+def dsq_nodes(tournament_id: int, *_args, **_kwargs) -> List[str]:
+    """Множество дисквалифицированных турнира."""
+    return [f"dsq:{int(tournament_id)}"]
+
+
+def stage_nodes(stage_id: int, *_args, **_kwargs) -> List[str]:
+    """Рейтинги групп и итоги финала одного этапа."""
+    return [f"stage:{int(stage_id)}"]
+
+
+def tournament_nodes(tournament_id: int, *_args, **_kwargs) -> List[str]:
+    """Всё, что выводится из турнира целиком: общий зачёт, отчёт."""
+    tid = int(tournament_id)
+    stage_ids = [int(r["id"]) for r in q_rows("SELECT id FROM stages WHERE tournament_id=? ORDER BY stage_idx",
+                                               (tid,))]
+    return [f"tournament:{tid}", f"qual:{tid}"] + [f"stage:{sid}" for sid in stage_ids]
@@ -0,0 +1,74 @@
+"""Разбор списков участников из Excel."""
+from typing import List, Tuple, Optional
+
+import pandas as pd
+
+
+def _detect_excel_discipline_columns(df: pd.DataFrame, scan_rows: int = 3) -> dict:
+    """
+    Сканирует заголовки Excel (строки 1–3): Дисциплина, под ней ТС/75, под ними ЛЗ.
+    Находит колонки: ФИО, 75 ЛЗ (дроны), ТС ЛЗ (симулятор).
+    """
+    result = {}
+    if df.empty or df.shape[1] == 0:
+        return result
+    n_cols = df.shape[1]
+    n_rows = min(scan_rows, len(df))
+
+    for col_idx in range(n_cols):
+        parts = []
+        for row_idx in range(n_rows):
+            val = df.iloc[row_idx, col_idx]
+            if pd.notna(val):
+                s = str(val).strip()
+                if s:
+                    parts.append(s.lower())
+        combined = "".join(parts).replace(" ", "").replace("\n", "")
+
+        if "фио" in combined:
+            result["fio"] = col_idx
+        if "категория" in combined:
+            result["category"] = col_idx
+        if "75" in combined and "лз" in combined:
+            result["75лз"] = col_idx
+        if ("тс" in combined or "tc" in combined) and "лз" in combined:
+            result["тслз"] = col_idx
+
+    if "fio" not in result and n_cols > 1:
+        result["fio"] = 1
+    return result
+
+
+def parse_excel_discipline_list(df: pd.DataFrame, discipline: str,
+                                  category_filter: Optional[str] = None, header_rows: int = 3) -> Tuple[List[str], dict]:
+    """
+    Парсит Excel: строки 1–3 — заголовки, с 4-й — данные.
+    category_filter: "Мальчики"|"Юниорки"|"Юниоры"|"Девочки"|None (все)
+    """
+    cols = _detect_excel_discipline_columns(df, scan_rows=header_rows)
+    disc_col = cols.get("75лз") if discipline == "drone_individual" else cols.get("тслз")
+    fio_col = cols.get("fio", 1)
+    cat_col = cols.get("category", 3)
+
+    if disc_col is None:
+        return [], cols
+
+    names = []
+    for row_idx in range(header_rows, len(df)):
+        row = df.iloc[row_idx]
+        if fio_col >= len(row):
+            continue
+        name = str(row.iloc[fio_col]).strip() if pd.notna(row.iloc[fio_col]) else ""
+        if not name or name.lower() in ("nan", "none", ""):
+            continue
+        if disc_col < len(row):
+            cell = row.iloc[disc_col]
+            val = str(cell).strip() if pd.notna(cell) else ""
+            if val != "+":
+                continue
+        if category_filter and cat_col < len(row):
+            cat_val = str(row.iloc[cat_col]).strip() if pd.notna(row.iloc[cat_col]) else ""
+            if cat_val != category_filter:
+                continue
+        names.append(name)
+    return names, cols
@@ -0,0 +1,222 @@
+"""Тексты интерфейса (RU/EN)."""
+
+I18N = {
+    "RU": {
+        "app_title": "🏁 Турнир по гонкам дронов (беспилотных воздушных судов)",
+        "language": "Язык",
+        "tournament": "Турнир",
+        "select_tournament": "Выбрать турнир",
+        "create_new": "➕ Создать новый",
+        "create_new_header": "Новый турнир",
+        "tournament_name": "Название турнира",
+        "discipline": "Дисциплина",
+        "create_tournament": "Создать турнир",
+        "time_limit": "Лимит времени (сек)",
+        "total_laps": "Кол-во кругов (по регламенту)",
+
+        # Дисциплины
+        "drone_individual": "Дроны: Личный зачёт",
+        "sim_individual": "Симулятор: Личный зачёт",
+        "sim_team": "Симулятор: Командный зачёт",
+        "coming_soon": "В разработке...",
+
+        # Навигация
+        "nav_overview": "📊 Обзор",
+        "nav_participants": "👥 Участники",
+        "nav_qualification": "⏱️ Квалификация",
+        "nav_bracket": "🏆 Сетка",
+        "nav_playoff": "🔥 Плей-офф",
+        "nav_final": "🥇 Финал",
+
+        # Обзор
+        "overview_title": "Обзор турнира",
+        "total_participants": "Участников",
+        "tournament_status": "Статус",
+        "status_setup": "Подготовка",
+        "status_qualification": "Квалификация",
+        "status_bracket": "Плей-офф",
+        "status_finished": "Завершён",
+
+        # Участники
+        "participants_title": "Список участников",
+        "add_participant": "Добавить участника",
+        "pilot_name": "Имя пилота",
+        "add": "Добавить",
+        "random_draw": "🎲 Жеребьёвка (случайные номера)",
+        "draw_done": "Жеребьёвка проведена!",
+        "draw_already": "Жеребьёвка уже проведена",
+        "start_number": "Стартовый №",
+        "demo_fill": "Тестовое заполнение",
+        "demo_hint": "Быстро добавить тестовых участников",
+        "demo_count": "Количество",
+        "demo_prefix": "Префикс имени",
+        "demo_add": "Добавить тестовых",
+        "demo_already": "Участники уже добавлены",
+        "demo_added": "Добавлено участников",
+
+        # Квалификация
+        "qual_title": "Квалификационный этап",
+        "qual_info": "Введите результаты каждого пилота. Система автоматически определит кто проходит дальше.",
+        "time_seconds": "Время (сек)",
+        "laps_completed": "Круги.Препятствия",
+        "completed_all": "Все 3 круга",
+        "projected_time": "Расчётное время (3 кр.)",
+        "qual_rank": "Место",
+        "qual_cutoff": "Проходят: {} из {}",
+        "qual_finish": "✅ Завершить квалификацию → Сформировать сетку",
+        "qual_not_all": "Не все результаты введены!",
+        "qual_done": "Квалификация завершена!",
+
+        # Сетка
+        "bracket_title": "Турнирная сетка",
+        "group": "Группа",
+        "advance_stage": "➡️ Перейти к следующему этапу",
+        "start_playoff": "🚀 Начать плей-офф",
+        "last_stage": "Это финальный этап",
+        "tie_warning": "⚠️ Обнаружено равенство очков! Возможно потребуется доп. вылет.",
+        "waiting_for_qual": "Ожидание завершения квалификации",
+
+        # Плей-офф
+        "playoff_title": "Плей-офф — ввод результатов",
+        "playoff_not_started": "Плей-офф ещё не начался",
+        "select_round": "Выберите раунд",
+        "select_group": "Группа",
+
+        # Финал
+        "final_title": "ФИНАЛ",
+        "heat_n": "Вылет {}",
+        "final_standings": "Итоговая таблица финала",
+        "champion": "🏆 ЧЕМПИОН",
+        "bonus_note": "Бонус +1 за 2 и более побед в вылетах",
+
+        # Симулятор
+        "track": "Трасса",
+        "track_n": "Трасса {}",
+        "attempt_n": "Попытка {}",
+        "sim_qual_info": "Введите результаты каждого пилота. Лимит 2 минуты, 3 круга.",
+        "sim_group_results": "Сводка группы",
+
+        # Общее
+        "saved": "✅ Сохранено!",
+        "error": "Ошибка",
+        "download_csv": "📥 Скачать CSV",
+        "place_short": "м.",
+        "points": "Очки",
+        "pilot": "Пилот",
+        "time": "Время",
+        "laps": "Круги",
+        "place": "Место",
+
+        # Дисквалификация
+        "disqualify": "Дисквалифицировать (техпор)",
+        "disqualify_undo": "Снять дисквалификацию",
+        "disqualified": "DSQ",
+        "disqualified_full": "Дисквалифицирован",
+    },
+    "EN": {
+        "app_title": "🏁 UAV Drone Racing Tournament",
+        "language": "Language",
+        "tournament": "Tournament",
+        "select_tournament": "Select tournament",
+        "create_new": "➕ Create new",
+        "create_new_header": "New tournament",
+        "tournament_name": "Tournament name",
+        "discipline": "Discipline",
+        "create_tournament": "Create tournament",
+        "time_limit": "Time limit (sec)",
+        "total_laps": "Laps count (regulation)",
+
+        "drone_individual": "Drones: Individual",
+        "sim_individual": "Simulator: Individual",
+        "sim_team": "Simulator: Team",
+        "coming_soon": "Coming soon...",
+
+        "nav_overview": "📊 Overview",
+        "nav_participants": "👥 Participants",
+        "nav_qualification": "⏱️ Qualification",
+        "nav_bracket": "🏆 Bracket",
+        "nav_playoff": "🔥 Playoff",
+        "nav_final": "🥇 Final",
+
+        "overview_title": "Tournament Overview",
+        "total_participants": "Participants",
+        "tournament_status": "Status",
+        "status_setup": "Setup",
+        "status_qualification": "Qualification",
+        "status_bracket": "Playoff",
+        "status_finished": "Finished",
+
+        "participants_title": "Participants",
+        "add_participant": "Add participant",
+        "pilot_name": "Pilot name",
+        "add": "Add",
+        "random_draw": "🎲 Random draw",
+        "draw_done": "Draw completed!",
+        "draw_already": "Draw already done",
+        "start_number": "Start #",
+        "demo_fill": "Test fill",
+        "demo_hint": "Quick add test participants",
+        "demo_count": "Count",
+        "demo_prefix": "Name prefix",
+        "demo_add": "Add test",
+        "demo_already": "Participants already added",
+        "demo_added": "Added participants",
+
+        "qual_title": "Qualification",
+        "qual_info": "Enter results for each pilot. System auto-determines who advances.",
+        "time_seconds": "Time (sec)",
+        "laps_completed": "Laps.Obstacles",
+        "completed_all": "All 3 laps",
+        "projected_time": "Projected time (3 laps)",
+        "qual_rank": "Rank",
+        "qual_cutoff": "Advancing: {} of {}",
+        "qual_finish": "✅ Finish Qualification → Generate Bracket",
+        "qual_not_all": "Not all results entered!",
+        "qual_done": "Qualification complete!",
+
+        "bracket_title": "Tournament Bracket",
+        "group": "Group",
+        "advance_stage": "➡️ Advance to next stage",
+        "start_playoff": "🚀 Start Playoff",
+        "last_stage": "This is the final stage",
+        "tie_warning": "⚠️ Tie detected! Extra heat may be required.",
+        "waiting_for_qual": "Waiting for qualification",
+
+        "playoff_title": "Playoff — Enter Results",
+        "playoff_not_started": "Playoff not started yet",
+        "select_round": "Select round",
+        "select_group": "Group",
+
+        "final_title": "FINAL",
+        "heat_n": "Heat {}",
+        "final_standings": "Final Standings",
+        "champion": "🏆 CHAMPION",
+        "bonus_note": "Bonus +1 for 2+ first-place finishes",
+
+        "track": "Track",
+        "track_n": "Track {}",
+        "attempt_n": "Attempt {}",
+        "sim_qual_info": "Enter results for each pilot. 2 minute limit, 3 laps.",
+        "sim_group_results": "Group summary",
+
+        "saved": "✅ Saved!",
+        "error": "Error",
+        "download_csv": "📥 Download CSV",
+        "place_short": "pl.",
+        "points": "Points",
+        "pilot": "Pilot",
+        "time": "Time",
+        "laps": "Laps",
+        "place": "Place",
+
+        "disqualify": "Disqualify (technical defeat)",
+        "disqualify_undo": "Remove disqualification",
+        "disqualified": "DSQ",
+        "disqualified_full": "Disqualified",
+    }
+}
+
+
+def translate(key: str, lang: str = "RU") -> str:
+    """Текст по ключу на языке lang; нет перевода — русский вариант, нет ключа — сам ключ."""
+    return I18N.get(lang, I18N["RU"]).get(key, I18N["RU"].get(key, key))
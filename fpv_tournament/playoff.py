@@ -0,0 +1,865 @@
+"""Плей-офф: этапы, группы, вылеты, ранжирование, прогресс групп и переходы между этапами."""
+import json
+import sqlite3
+from typing import Dict, List, Tuple, Optional
+
+import pandas as pd
+
+from .database import (
+    exec_many, exec_sql, q_one, q_rows, q_scalar, qdf, request_memo, shared_cache, transaction
+)
+from .dependencies import stage_nodes
+from .ranking import rank_frame, tie_groups
+from .bracket import (
+    FINAL_SCORING, StageDef, bracket_from_json, bracket_to_json, compute_bracket_size, generate_bracket
+)
+from .qualification import (
+    _apply_dsq_to_ranking, calc_projected_time, get_disqualified_pids, get_qual_ranking, get_tournament,
+    rank_results, save_qual_result
+)
+
+
+def set_participant_disqualified(participant_id: int, disqualified: bool):
+    """Устанавливает или снимает дисквалификацию участника.
+    При дисквалификации: авто-проставляет худший результат в квалификацию и во все heat_results."""
+    with transaction():
+        exec_sql("UPDATE participants SET disqualified=? WHERE id=?",
+                 (1 if disqualified else 0, participant_id))
+        if disqualified:
+            # Получаем tournament_id и total_laps
+            p_row = q_one("SELECT p.tournament_id, COALESCE(t.total_laps, 3) as total_laps "
+                          "FROM participants p LEFT JOIN tournaments t ON t.id=p.tournament_id WHERE p.id=?",
+                          (participant_id,))
+            if p_row is not None:
+                save_qual_result(int(p_row["tournament_id"]), participant_id, 9999.0, 0.0, False,
+                                 int(p_row["total_laps"]))
+            # Обновляем все heat_results участника на худший результат
+            exec_sql("""
+                UPDATE heat_results SET time_seconds=9999, laps_completed=0, completed_all_laps=0,
+                       place=4, points=0, projected_time=9999
+                WHERE participant_id=? AND heat_id IN (
+                    SELECT h.id FROM heats h
+                    JOIN groups g ON g.id=h.group_id
+                    JOIN stages s ON s.id=g.stage_id
+                    WHERE s.tournament_id=(SELECT tournament_id FROM participants WHERE id=?)
+                )
+            """, (participant_id, participant_id))
+        # DSQ меняет рейтинг групп участника, а с ним и ничьи на границе прохода
+        refresh_participant_progress(participant_id)
+
+
+def delete_participant(participant_id: int):
+    """Удаляет участника вместе с его результатами. Строки удаляются явно, а не каскадом
+    внешних ключей: group_progress и group_standings его групп выводятся из heat_results
+    и пересчитываются в той же транзакции."""
+    groups = q_rows("""SELECT g.stage_id, g.group_no FROM group_members gm
+                       JOIN groups g ON g.id=gm.group_id WHERE gm.participant_id=?""", (participant_id,))
+    with transaction():
+        exec_sql("DELETE FROM heat_results WHERE participant_id=?", (participant_id,))
+        exec_sql("DELETE FROM group_members WHERE participant_id=?", (participant_id,))
+        exec_sql("DELETE FROM team_pilots WHERE participant_id=?", (participant_id,))
+        exec_sql("DELETE FROM qualification_results WHERE participant_id=?", (participant_id,))
+        exec_sql("DELETE FROM participants WHERE id=?", (participant_id,))
+        for r in groups:
+            refresh_group_progress(int(r["stage_id"]), int(r["group_no"]))
+
+
+@request_memo
+def get_all_stages(tournament_id: int) -> pd.DataFrame:
+    return qdf("SELECT * FROM stages WHERE tournament_id=? ORDER BY stage_idx", (tournament_id,))
+
+
+def get_active_stage(tournament_id: int) -> Optional[pd.Series]:
+    df = qdf("SELECT * FROM stages WHERE tournament_id=? AND status='active' ORDER BY stage_idx DESC LIMIT 1",
+             (tournament_id,))
+    return df.iloc[0] if not df.empty else None
+
+
+def create_stage(tournament_id: int, stage_idx: int, sd: StageDef) -> int:
+    with transaction():
+        exec_sql("""INSERT OR IGNORE INTO stages(tournament_id, stage_idx, code, group_size,
+                    group_count, qualifiers, heats_count, status)
+                    VALUES(?,?,?,?,?,?,?,'active')""",
+                 (tournament_id, stage_idx, sd.code, sd.group_size, sd.group_count,
+                  sd.qualifiers, sd.heats_count))
+        stage_id = int(q_scalar("SELECT id FROM stages WHERE tournament_id=? AND stage_idx=?",
+                                (tournament_id, stage_idx)))
+        existing = int(q_scalar("SELECT COUNT(*) FROM groups WHERE stage_id=?", (stage_id,)))
+        if existing == 0:
+            exec_many("INSERT INTO groups(stage_id, group_no) VALUES(?,?)",
+                      [(stage_id, gno) for gno in range(1, sd.group_count + 1)])
+        refresh_stage_progress(stage_id)
+    return stage_id
+
+
+def seed_groups_from_qual(tournament_id: int, stage_id: int, seeding_map: Dict[int, List[int]], advancing: int):
+    """Посев из квалификации в первый этап плей-офф."""
+    ranking = get_qual_ranking(tournament_id)
+    if ranking.empty:
+        return
+    # Берём только прошедших
+    ranking = ranking.head(advancing)
+
+    with transaction():
+        gid_by_no = {int(r["group_no"]): int(r["id"])
+                     for r in q_rows("SELECT id, group_no FROM groups WHERE stage_id=?", (stage_id,))}
+
+        inserts = []
+        for gno, seeds in seeding_map.items():
+            for qual_rank in seeds:
+                if qual_rank <= len(ranking):
+                    pid = int(ranking.iloc[qual_rank - 1]["pid"])
+                    inserts.append((gid_by_no[gno], pid))
+
+        exec_many("INSERT OR IGNORE INTO group_members(group_id, participant_id) VALUES(?,?)", inserts)
+        refresh_stage_progress(stage_id)
+
+
+def get_group_members(stage_id: int, group_no: int) -> pd.DataFrame:
+    return qdf("""
+        SELECT p.id as pid, p.name, p.start_number
+        FROM groups g
+        JOIN group_members gm ON gm.group_id=g.id
+        JOIN participants p ON p.id=gm.participant_id
+        WHERE g.stage_id=? AND g.group_no=?
+        ORDER BY p.start_number
+    """, (stage_id, int(group_no)))
+
+
+def get_groups_for_stages(stage_ids) -> Dict[int, Dict[int, pd.DataFrame]]:
+    """Составы всех групп нескольких этапов одним запросом: {stage_id: {group_no: members}}.
+    members — как в get_group_members (pid, name, start_number); пустые группы тоже включены."""
+    stage_ids = [int(sid) for sid in stage_ids]
+    if not stage_ids:
+        return {}
+    df = qdf("""
+        SELECT g.stage_id, g.group_no, p.id as pid, p.name, p.start_number
+        FROM groups g
+        LEFT JOIN group_members gm ON gm.group_id=g.id
+        LEFT JOIN participants p ON p.id=gm.participant_id
+        WHERE g.stage_id IN ({})
+        ORDER BY g.stage_id, g.group_no, p.start_number, p.id
+    """.format(",".join("?" * len(stage_ids))), tuple(stage_ids))
+    result: Dict[int, Dict[int, pd.DataFrame]] = {sid: {} for sid in stage_ids}
+    for (sid, gno), sub in df.groupby(["stage_id", "group_no"], sort=True):
+        members = sub[sub["pid"].notna()][["pid", "name", "start_number"]].reset_index(drop=True)
+        members["pid"] = members["pid"].astype(int)
+        if members["start_number"].notna().all():
+            members["start_number"] = members["start_number"].astype(int)
+        result[int(sid)][int(gno)] = members
+    return result
+
+
+@request_memo
+def get_all_groups(stage_id: int) -> Dict[int, pd.DataFrame]:
+    return get_groups_for_stages([stage_id])[stage_id]
+
+
+def save_heat(stage_id: int, group_no: int, heat_no: int, results: List[Dict],
+              is_final: bool = False, track_no: int = 1, scoring: Optional[Dict] = None):
+    """Сохранить результаты вылета. results = [{pid, time_seconds, laps_completed, completed_all_laps}]
+    scoring: если передан, используется вместо FINAL_SCORING (например SIM_SCORING).
+    Все записи выполняются одной транзакцией: вылет не может остаться без результатов."""
+    # Ранжируем
+    ranked = rank_results(results)
+    score_map = scoring if scoring is not None else (FINAL_SCORING if is_final else None)
+
+    with transaction():
+        group_id = int(q_scalar("SELECT id FROM groups WHERE stage_id=? AND group_no=?",
+                                (stage_id, group_no)))
+        exec_sql("INSERT OR IGNORE INTO heats(group_id, heat_no, track_no) VALUES(?,?,?)",
+                 (group_id, heat_no, track_no))
+        heat_id = int(q_scalar("SELECT id FROM heats WHERE group_id=? AND heat_no=? AND track_no=?",
+                               (group_id, heat_no, track_no)))
+
+        tournament = q_one("SELECT t.total_laps, t.discipline FROM stages s JOIN tournaments t ON t.id=s.tournament_id WHERE s.id=?",
+                           (stage_id,))
+        total_laps = int(tournament["total_laps"]) if tournament is not None else 3
+        disc = tournament["discipline"] if tournament is not None else "drone_individual"
+
+        rows = []
+        for r in ranked:
+            if disc in ("sim_individual", "sim_team"):
+                projected = None  # Нет расчётного времени для симулятора
+            else:
+                projected = calc_projected_time(r["time_seconds"], r["laps_completed"], total_laps) \
+                    if not r["completed_all_laps"] else r["time_seconds"]
+            pts = score_map.get(r["place"], 0) if score_map else 0
+            rows.append((heat_id, r["pid"], r["time_seconds"], r["laps_completed"],
+                          int(r["completed_all_laps"]), projected, r["place"], pts))
+
+        exec_sql("DELETE FROM heat_results WHERE heat_id=?", (heat_id,))
+        exec_many("""INSERT INTO heat_results(heat_id, participant_id, time_seconds, laps_completed,
+                     completed_all_laps, projected_time, place, points) VALUES(?,?,?,?,?,?,?,?)""", rows)
+        refresh_group_progress(stage_id, group_no)
+
+
+def get_heat_results(stage_id: int, group_no: int, heat_no: int, track_no: int = 1) -> List[Dict]:
+    heat_id = q_scalar("""SELECT h.id FROM heats h JOIN groups g ON g.id=h.group_id
+                          WHERE g.stage_id=? AND g.group_no=? AND h.heat_no=? AND h.track_no=?""",
+                       (stage_id, group_no, heat_no, track_no))
+    if heat_id is None:
+        return []
+    df = qdf("""SELECT hr.*, p.name, p.start_number FROM heat_results hr
+                JOIN participants p ON p.id=hr.participant_id
+                WHERE hr.heat_id=? ORDER BY hr.place""", (heat_id,))
+    return df.to_dict("records") if not df.empty else []
+
+
+def _tournament_id_from_stage(stage_id: int) -> Optional[int]:
+    tid = q_scalar("SELECT tournament_id FROM stages WHERE id=?", (stage_id,))
+    return int(tid) if tid is not None else None
+
+
+def compute_group_ranking(stage_id: int, group_no: int, discipline: str = "drone_individual",
+                          scoring_mode: str = "none") -> pd.DataFrame:
+    """Ранжирование в группе (из group_standings): для дронов — один вылет, для сима — агрегация + тайбрейк.
+    discipline и scoring_mode учтены при записи рейтинга и оставлены для совместимости."""
+    return compute_stage_rankings(stage_id, discipline, scoring_mode).get(int(group_no), pd.DataFrame())
+
+
+def compute_stage_rankings(stage_id: int, discipline: str = "drone_individual",
+                           scoring_mode: str = "none") -> Dict[int, pd.DataFrame]:
+    """Ранжирование всех групп этапа одним запросом к group_standings: {group_no: DataFrame}.
+    Пустые группы и группы без результатов — пустой DataFrame."""
+    standings = get_group_standings(stage_id)
+    return {gno: standings.get(gno, pd.DataFrame()) for gno in get_all_groups(stage_id)}
+
+
+@request_memo
+def get_group_standings(stage_id: int) -> Dict[int, pd.DataFrame]:
+    """Материализованные рейтинги групп этапа, упорядоченные по rank: {group_no: DataFrame}.
+    Группы старых или импортированных БД без записи прогресса досчитываются один раз."""
+    if q_scalar("""SELECT 1 FROM groups g LEFT JOIN group_progress gp ON gp.group_id=g.id
+                   WHERE g.stage_id=? AND gp.group_id IS NULL LIMIT 1""", (stage_id,)):
+        refresh_stage_progress(stage_id)
+    df = qdf("""
+        SELECT g.group_no, gs.participant_id, p.name, p.start_number, gs.rank, gs.total_points, gs.wins,
+               gs.heats_played, gs.time_seconds, gs.projected_time, gs.heat_place
+        FROM group_standings gs
+        JOIN groups g ON g.id=gs.group_id
+        JOIN participants p ON p.id=gs.participant_id
+        WHERE gs.stage_id=?
+        ORDER BY g.group_no, gs.rank
+    """, (stage_id,))
+    return {int(gno): sub.drop(columns=["group_no"]).reset_index(drop=True)
+            for gno, sub in df.groupby("group_no", sort=True)}
+
+
+@shared_cache(stage_nodes)
+def compute_final_standings(stage_id: int) -> pd.DataFrame:
+    """Итоги финала: сумма очков за 3 основных вылета + бонус.
+    Тайбрейкеры (вылеты 4+) используются только для разрешения ничьих."""
+    group_id = q_scalar("SELECT id FROM groups WHERE stage_id=? AND group_no=1", (stage_id,))
+    if group_id is None:
+        return pd.DataFrame()
+
+    # Все вылеты группы одним запросом: строка на (участник, вылет)
+    long = qdf("""
+        SELECT p.id as pid, p.name, p.start_number, h.heat_no, h.track_no,
+               hr.heat_id as result_heat, hr.place, hr.points
+        FROM group_members gm
+        JOIN participants p ON p.id=gm.participant_id
+        LEFT JOIN heats h ON h.group_id=gm.group_id
+        LEFT JOIN heat_results hr ON hr.heat_id=h.id AND hr.participant_id=p.id
+        WHERE gm.group_id=?
+    """, (group_id,))
+    if long.empty:
+        return pd.DataFrame()
+
+    # Очки только за основные 3 вылета
+    main = long[long["heat_no"] <= 3]
+    df = long[["pid", "name", "start_number"]].drop_duplicates("pid").sort_values("pid").reset_index(drop=True)
+    agg = main.groupby("pid").agg(total_points=("points", "sum"),
+                                  wins=("place", lambda s: int((s == 1).sum())),
+                                  heats_played=("result_heat", "count"))
+    df = df.join(agg, on="pid")
+    for col in ("total_points", "wins", "heats_played"):
+        df[col] = df[col].fillna(0).astype(int)
+
+    # Бонус +1 за 2+ побед
+    df["bonus"] = (df["wins"] >= 2).astype(int)
+    df["total"] = df["total_points"] + df["bonus"]
+
+    # Тайбрейки (вылеты 4+ трассы 1, по которым есть результаты): место участника, 99 — не летал
+    tb = long[(long["heat_no"] >= 4) & (long["track_no"] == 1) & long["result_heat"].notna()]
+    tb_places = tb.pivot_table(index="pid", columns="heat_no", values="place", aggfunc="min")
+    tb_cols = [f"tb_{int(h)}" for h in tb_places.columns]
+    tb_places.columns = tb_cols
+    # Ключ тайбрейка — плотный ранг лексикографического набора мест (меньше — лучше)
+    if tb_cols:
+        places = df[["pid"]].join(tb_places, on="pid")[tb_cols].fillna(99).astype(int)
+        df["tiebreak_key"] = places.groupby(tb_cols, sort=True).ngroup().to_numpy()
+        df[tb_cols] = places
+    else:
+        df["tiebreak_key"] = 0
+
+    # Сортировка: total DESC, wins DESC, затем тайбрейки по порядку (место ASC)
+    df = df.sort_values(["total", "wins"] + tb_cols, ascending=[False, False] + [True] * len(tb_cols),
+                        kind="stable").reset_index(drop=True)
+    df["rank"] = range(1, len(df) + 1)
+
+    # Определяем наличие ничьих (по total баллам, без учёта тайбрейков)
+    df["has_tie"] = df.duplicated(subset=["total"], keep=False)
+
+    tid = _tournament_id_from_stage(stage_id)
+    return _apply_dsq_to_ranking(df, tid, "pid") if tid else df
+
+
+def detect_final_ties(standings: pd.DataFrame) -> List[List[int]]:
+    """Находит группы участников с одинаковыми очками, которые ещё не разрешены тайбрейком.
+    Возвращает список групп pid'ов с ничьими (в порядке мест)."""
+    if standings.empty:
+        return []
+    by_total = rank_frame(standings, [("total", False)])
+    # Ничья разрешена, если тайбрейки развели всех равных по очкам
+    if "tiebreak_key" in standings.columns:
+        by_tb = rank_frame(standings, [("total", False), ("tiebreak_key", True)])
+        unresolved = set(by_tb.loc[by_tb["tie_group"] >= 0, "pid"].astype(int))
+    else:
+        unresolved = set(by_total.loc[by_total["tie_group"] >= 0, "pid"].astype(int))
+    return [group for group in tie_groups(by_total, "pid") if unresolved.intersection(group)]
+
+
+@shared_cache(stage_nodes)
+def compute_sim_group_ranking(stage_id: int, group_no: int, scoring_mode: str = "sum_all") -> pd.DataFrame:
+    """Ранжирование в группе для симулятора (2 трассы × 3 попытки).
+    Сумма очков за все 6 вылетов. Макс 24 очка."""
+    group_id = q_scalar("SELECT id FROM groups WHERE stage_id=? AND group_no=?", (stage_id, group_no))
+    if group_id is None:
+        return pd.DataFrame()
+
+    members = get_group_members(stage_id, group_no)
+    if members.empty:
+        return pd.DataFrame()
+
+    # Сумма очков за все вылеты (исключая тайбрейки track_no=99)
+    df = qdf("""
+        SELECT hr.participant_id, p.name, p.start_number,
+               COALESCE(SUM(hr.points), 0) as total_points,
+               COUNT(hr.heat_id) as heats_played
+        FROM heat_results hr
+        JOIN heats h ON h.id=hr.heat_id
+        JOIN participants p ON p.id=hr.participant_id
+        WHERE h.group_id=? AND h.track_no < 99
+        GROUP BY hr.participant_id
+    """, (group_id,))
+    if df.empty:
+        return pd.DataFrame()
+    df = _rank_sim_totals(df)
+    tid = _tournament_id_from_stage(stage_id)
+    return _apply_dsq_to_ranking(df, tid, "participant_id") if tid else df
+
+
+def _rank_sim_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """Сортировка сводки симулятора по сумме очков и проставление мест (без DSQ)."""
+    df = df.sort_values("total_points", ascending=False).reset_index(drop=True)
+    df["rank"] = range(1, len(df) + 1)
+    return df
+
+
+def _sim_track_bests_rows(stage_id: int, group_no: Optional[int] = None) -> List[sqlite3.Row]:
+    """Лучшее время на трассах 1/2 для каждого участника групп этапа (или одной группы)."""
+    group_filter = "" if group_no is None else " AND g.group_no=?"
+    params = (stage_id,) if group_no is None else (stage_id, group_no)
+    return q_rows(f"""
+        SELECT g.group_no, gm.participant_id as pid,
+               MIN(CASE WHEN h.track_no=1 AND hr.time_seconds > 0 THEN hr.time_seconds END) as t1,
+               MIN(CASE WHEN h.track_no=2 AND hr.time_seconds > 0 THEN hr.time_seconds END) as t2
+        FROM groups g
+        JOIN group_members gm ON gm.group_id=g.id
+        JOIN participants p ON p.id=gm.participant_id
+        LEFT JOIN heats h ON h.group_id=g.id AND h.track_no IN (1, 2)
+        LEFT JOIN heat_results hr ON hr.heat_id=h.id AND hr.participant_id=gm.participant_id
+        WHERE g.stage_id=?{group_filter}
+        GROUP BY g.group_no, gm.participant_id
+        ORDER BY g.group_no, p.start_number, gm.participant_id
+    """, params)
+
+
+@request_memo
+def get_sim_track_bests(stage_id: int, group_no: int) -> Dict[int, Dict]:
+    """Для каждого пилота в группе — лучшее время на Трассе 1 и Трассе 2.
+    Возвращает {pid: {'t1': best_time_or_None, 't2': best_time_or_None}}."""
+    return {int(r["pid"]): {"t1": r["t1"], "t2": r["t2"]}
+            for r in _sim_track_bests_rows(stage_id, group_no)}
+
+
+@request_memo
+def get_stage_sim_track_bests(stage_id: int) -> Dict[int, Dict[int, Dict]]:
+    """То же для всех групп этапа одним запросом: {group_no: {pid: {'t1': ..., 't2': ...}}}."""
+    result: Dict[int, Dict[int, Dict]] = {}
+    for r in _sim_track_bests_rows(stage_id):
+        result.setdefault(int(r["group_no"]), {})[int(r["pid"])] = {"t1": r["t1"], "t2": r["t2"]}
+    return result
+
+
+def detect_sim_group_ties(stage_id: int, group_no: int, scoring_mode: str, qualifiers: int = 2) -> List[List[int]]:
+    """Обнаруживает критические ничьи в группе симулятора.
+    Критическая ничья — когда пилоты на границе прохода имеют одинаковые очки
+    (например, 2-е и 3-е место при qualifiers=2).
+    Возвращает список групп pid'ов с критическими ничьими."""
+    ranking = compute_sim_group_ranking(stage_id, group_no, scoring_mode)
+    return find_cutoff_ties(ranking, qualifiers)
+
+
+def find_cutoff_ties(ranking: pd.DataFrame, qualifiers: int) -> List[List[int]]:
+    """Критические ничьи на границе прохода по уже посчитанному рейтингу группы (без запросов к БД):
+    пилоты с очками последнего проходящего есть и выше, и ниже границы."""
+    if ranking.empty or qualifiers < 1 or len(ranking) <= qualifiers:
+        return []
+
+    pid_col = "participant_id" if "participant_id" in ranking.columns else "pid"
+    # Индекс — позиция в рейтинге; lexsort устойчив, так что порядок равных сохраняется
+    ranked = rank_frame(ranking.reset_index(drop=True), [("total_points", False)])
+    cutoff_group = ranked.loc[qualifiers - 1, "tie_group"]  # группа последнего проходящего
+    if cutoff_group < 0:
+        return []
+    positions = ranked.index[ranked["tie_group"] == cutoff_group].sort_values()
+    if positions.min() < qualifiers <= positions.max():
+        return [[int(ranked.loc[i, pid_col]) for i in positions]]
+    return []
+
+
+# Столбцы итогового рейтинга группы симулятора (как у compute_sim_group_ranking)
+_SIM_RANKING_COLUMNS = ["participant_id", "name", "start_number", "total_points", "heats_played", "rank"]
+
+
+def resolve_sim_tiebreaker(stage_id: int, group_no: int, scoring_mode: str) -> pd.DataFrame:
+    """Рейтинг группы симулятора с учётом тайбрейков (track_no=99) из group_standings.
+    scoring_mode учтён при записи рейтинга и оставлен для совместимости."""
+    ranking = get_group_standings(stage_id).get(int(group_no))
+    if ranking is None:
+        return pd.DataFrame()
+    return ranking[_SIM_RANKING_COLUMNS].astype({"total_points": int, "heats_played": int})
+
+
+def _compute_sim_resolved_ranking(stage_id: int, group_no: int, scoring_mode: str) -> pd.DataFrame:
+    """Пересчитывает ранжирование группы с учётом тайбрейков (track_no=99) по вылетам —
+    для записи в group_standings."""
+    ranking = compute_sim_group_ranking(stage_id, group_no, scoring_mode)
+    if ranking.empty:
+        return ranking
+
+    pid_col = "participant_id" if "participant_id" in ranking.columns else "pid"
+
+    # Проверяем, есть ли тайбрейк-вылеты (track_no=99)
+    tb_results = get_heat_results(stage_id, group_no, 1, track_no=99)
+    if not tb_results:
+        return ranking
+
+    tb_rank = {r["participant_id"]: r["place"] for r in tb_results}
+    ranking = _apply_sim_tiebreak(ranking, tb_rank)
+    tid = _tournament_id_from_stage(stage_id)
+    return _apply_dsq_to_ranking(ranking, tid, pid_col) if tid else ranking
+
+
+def _apply_sim_tiebreak(ranking: pd.DataFrame, tb_rank: Dict[int, int]) -> pd.DataFrame:
+    """Учитывает места тайбрейк-вылета {pid: place} в рейтинге группы (без DSQ)."""
+    pid_col = "participant_id" if "participant_id" in ranking.columns else "pid"
+    # Победитель тайбрейка (1-е место) получает +1 очко
+    for i, row in ranking.iterrows():
+        pid = int(row[pid_col])
+        if tb_rank.get(pid) == 1:
+            ranking.at[i, "total_points"] = int(row["total_points"]) + 1
+
+    # Пересортируем и при равных очках — по месту в тайбрейке
+    ranking["tiebreak"] = ranking[pid_col].map(lambda x: tb_rank.get(int(x), 999))
+    ranking = ranking.sort_values(["total_points", "tiebreak"], ascending=[False, True]).reset_index(drop=True)
+    ranking["rank"] = range(1, len(ranking) + 1)
+    return ranking.drop(columns=["tiebreak"])
+
+
+def compute_sim_final_standings(stage_id: int, scoring_mode: str) -> pd.DataFrame:
+    """Итоги финала симулятора: те же правила, что и групповой этап, но без бонусов."""
+    return resolve_sim_tiebreaker(stage_id, 1, scoring_mode)
+
+
+def get_stage_heat_counts(stage_id: int, group_no: Optional[int] = None) -> Dict[Tuple[int, int, int], int]:
+    """Число результатов по каждому вылету этапа (или одной группы): {(group_no, track_no, heat_no): count}."""
+    group_filter = "" if group_no is None else " AND g.group_no=?"
+    params = (stage_id,) if group_no is None else (stage_id, group_no)
+    rows = q_rows(f"""
+        SELECT g.group_no, h.track_no, h.heat_no, COUNT(p.id) as results
+        FROM groups g
+        JOIN heats h ON h.group_id=g.id
+        LEFT JOIN heat_results hr ON hr.heat_id=h.id
+        LEFT JOIN participants p ON p.id=hr.participant_id
+        WHERE g.stage_id=?{group_filter}
+        GROUP BY g.group_no, h.track_no, h.heat_no
+    """, params)
+    return {(int(r["group_no"]), int(r["track_no"]), int(r["heat_no"])): int(r["results"]) for r in rows}
+
+
+def required_heats(heats_count: int, disc: str = "drone_individual") -> List[Tuple[int, int]]:
+    """Обязательные вылеты группы: [(track_no, heat_no)]."""
+    if disc in ("sim_individual", "sim_team"):
+        # Для симулятора: 2 трассы × 3 попытки = 6 вылетов
+        return [(track, attempt) for track in [1, 2] for attempt in [1, 2, 3]]
+    # Для дронов: heats_count вылетов (1 для плей-офф, 3 для финала)
+    return [(1, h) for h in range(1, heats_count + 1)]
+
+
+def refresh_group_progress(stage_id: int, group_no: int,
+                           heat_counts: Optional[Dict[Tuple[int, int, int], int]] = None):
+    """Пересчитывает записи group_progress и group_standings одной группы. Вызывается из путей записи."""
+    info = q_one("""
+        SELECT g.id as group_id, s.tournament_id, s.code, s.heats_count, s.qualifiers, t.discipline,
+               t.scoring_mode
+        FROM groups g
+        JOIN stages s ON s.id=g.stage_id
+        JOIN tournaments t ON t.id=s.tournament_id
+        WHERE g.stage_id=? AND g.group_no=?
+    """, (stage_id, group_no))
+    if info is None:
+        return
+    if heat_counts is None:
+        heat_counts = get_stage_heat_counts(stage_id, group_no)
+    disc = str(info["discipline"])
+    members = int(q_scalar("SELECT COUNT(*) FROM group_members WHERE group_id=?", (info["group_id"],)))
+    needed = required_heats(int(info["heats_count"]), disc)
+    missing = [[track, heat] for track, heat in needed if not heat_counts.get((group_no, track, heat))]
+
+    # Ничья на границе прохода (симулятор) не разрешена, пока нет тайбрейк-вылета (track_no=99)
+    tied: List[List[int]] = []
+    if disc in ("sim_individual", "sim_team") and members and not missing \
+            and not heat_counts.get((group_no, 99, 1)):
+        ranking = compute_sim_group_ranking(stage_id, group_no, str(info["scoring_mode"]))
+        tied = find_cutoff_ties(ranking, int(info["qualifiers"]))
+
+    exec_sql("""INSERT OR REPLACE INTO group_progress(group_id, stage_id, members, expected_heats,
+                filled_heats, missing, unresolved_ties, tied_pids) VALUES(?,?,?,?,?,?,?,?)""",
+             (info["group_id"], stage_id, members, len(needed), len(needed) - len(missing),
+              json.dumps(missing), len(tied), json.dumps(tied)))
+    _refresh_group_standings(stage_id, group_no, int(info["group_id"]), int(info["tournament_id"]),
+                             str(info["code"]), disc, str(info["scoring_mode"]))
+
+
+def _refresh_group_standings(stage_id: int, group_no: int, group_id: int, tournament_id: int, code: str,
+                             disc: str, scoring_mode: str):
+    """Перезаписывает group_standings группы по её вылетам: рейтинг, решающий проход
+    (для финала дронов — итоги финала, для сима — с учётом тайбрейка)."""
+    rows = []
+    if disc in ("sim_individual", "sim_team"):
+        ranking = _compute_sim_resolved_ranking(stage_id, group_no, scoring_mode)
+        for r in ranking.to_dict("records"):
+            rows.append((group_id, stage_id, int(r["participant_id"]), int(r["rank"]), int(r["total_points"]),
+                         None, int(r["heats_played"]), None, None, None))
+    elif code == "F":
+        ranking = compute_final_standings(stage_id) if group_no == 1 else pd.DataFrame()
+        for r in ranking.to_dict("records"):
+            rows.append((group_id, stage_id, int(r["pid"]), int(r["rank"]), int(r["total"]),
+                         int(r["wins"]), int(r["heats_played"]), None, None, None))
+    else:
+        # Один вылет; если первого нет — первый по номеру (как в общей таблице)
+        heat_id = q_scalar("SELECT id FROM heats WHERE group_id=? AND heat_no=1 AND track_no=1", (group_id,))
+        if heat_id is None:
+            heat_id = q_scalar("SELECT id FROM heats WHERE group_id=? ORDER BY heat_no LIMIT 1", (group_id,))
+        results = q_rows("""SELECT participant_id, time_seconds, projected_time, place
+                            FROM heat_results WHERE heat_id=? ORDER BY place""",
+                         (heat_id,)) if heat_id is not None else []
+        # Дисквалифицированные — в конце, как в _apply_dsq_to_ranking
+        dsq_pids = get_disqualified_pids(tournament_id)
+        ordered = [r for r in results if r["participant_id"] not in dsq_pids] + \
+                  [r for r in results if r["participant_id"] in dsq_pids]
+        for rank, r in enumerate(ordered, start=1):
+            rows.append((group_id, stage_id, int(r["participant_id"]), rank, None, None, 1,
+                         r["time_seconds"], r["projected_time"], r["place"]))
+    exec_sql("DELETE FROM group_standings WHERE group_id=?", (group_id,))
+    exec_many("""INSERT INTO group_standings(group_id, stage_id, participant_id, rank, total_points, wins,
+                 heats_played, time_seconds, projected_time, heat_place) VALUES(?,?,?,?,?,?,?,?,?,?)""", rows)
+
+
+def refresh_stage_progress(stage_id: int):
+    """Пересчитывает прогресс всех групп этапа (после создания, посева, перестановки)."""
+    heat_counts = get_stage_heat_counts(stage_id)
+    with transaction():
+        for r in q_rows("SELECT group_no FROM groups WHERE stage_id=?", (stage_id,)):
+            refresh_group_progress(stage_id, int(r["group_no"]), heat_counts)
+
+
+def refresh_participant_progress(participant_id: int):
+    """Пересчитывает прогресс групп, в которых состоит участник (например, после DSQ)."""
+    rows = q_rows("""SELECT g.stage_id, g.group_no FROM group_members gm
+                     JOIN groups g ON g.id=gm.group_id WHERE gm.participant_id=?""", (participant_id,))
+    with transaction():
+        for r in rows:
+            refresh_group_progress(int(r["stage_id"]), int(r["group_no"]))
+
+
+def get_stage_progress(stage_id: int) -> List[Dict]:
+    """Прогресс групп этапа из group_progress (упорядочено по group_no).
+    Группы без записи (старые или импортированные БД) досчитываются один раз."""
+    sql = """
+        SELECT g.group_no, gp.members, gp.expected_heats, gp.filled_heats,
+               gp.missing, gp.unresolved_ties, gp.tied_pids
+        FROM groups g
+        LEFT JOIN group_progress gp ON gp.group_id=g.id
+        WHERE g.stage_id=?
+        ORDER BY g.group_no
+    """
+    rows = q_rows(sql, (stage_id,))
+    if any(r["members"] is None for r in rows):
+        refresh_stage_progress(stage_id)
+        rows = q_rows(sql, (stage_id,))
+    return [{"group_no": int(r["group_no"]), "members": int(r["members"]),
+             "expected_heats": int(r["expected_heats"]), "filled_heats": int(r["filled_heats"]),
+             "missing": [tuple(m) for m in json.loads(r["missing"])],
+             "unresolved_ties": int(r["unresolved_ties"]), "tied_pids": json.loads(r["tied_pids"])}
+            for r in rows]
+
+
+def get_stage_progress_summary(stage_id: int) -> Dict[str, int]:
+    """Итог по этапу: группы, ожидаемые/заполненные вылеты, неразрешённые ничьи."""
+    progress = get_stage_progress(stage_id)
+    return {"groups": len(progress),
+            "expected_heats": sum(g["expected_heats"] for g in progress),
+            "filled_heats": sum(g["filled_heats"] for g in progress),
+            "unresolved_ties": sum(g["unresolved_ties"] for g in progress)}
+
+
+def get_missing_heats(stage_id: int) -> Dict[int, List[Tuple[int, int]]]:
+    """Каких обязательных вылетов без результатов не хватает каждой группе: {group_no: [(track_no, heat_no)]}."""
+    return {g["group_no"]: g["missing"] for g in get_stage_progress(stage_id)}
+
+
+def check_stage_results_complete(stage_id: int, stage_def: StageDef, disc: str = "drone_individual",
+                                 scoring_mode: str = "none") -> Tuple[bool, str]:
+    """Проверяет, все ли результаты заполнены для текущего этапа (по group_progress).
+    Возвращает (ok, message)."""
+    progress = get_stage_progress(stage_id)
+    if not progress:
+        return False, "Нет групп в этом этапе"
+
+    is_sim = disc in ("sim_individual", "sim_team")
+    missing = []
+    for g in progress:
+        gno = g["group_no"]
+        if g["members"] == 0:
+            missing.append(f"Группа {gno}: нет участников")
+            continue
+
+        for track, heat in g["missing"]:
+            if is_sim:
+                missing.append(f"Группа {gno}, Трасса {track}, Попытка {heat}: нет результатов")
+            elif stage_def.heats_count > 1:
+                missing.append(f"Группа {gno}, вылет {heat}: нет результатов")
+            else:
+                missing.append(f"Группа {gno}: нет результатов")
+
+        # Неразрешённые ничьи (только если все результаты заполнены)
+        if is_sim and not missing and g["tied_pids"]:
+            names_by_pid = {int(r["id"]): r["name"] for r in q_rows(
+                "SELECT id, name FROM participants WHERE id IN ({})".format(
+                    ",".join("?" * sum(len(tg) for tg in g["tied_pids"]))),
+                tuple(pid for tg in g["tied_pids"] for pid in tg))}
+            for tg in g["tied_pids"]:
+                names = [names_by_pid.get(pid, "") for pid in tg]
+                missing.append(f"Группа {gno}: ничья между {', '.join(names)} — нужен доп. вылет")
+    if missing:
+        return False, "Не все результаты заполнены:\n" + "\n".join(missing)
+    return True, ""
+
+
+def advance_to_next_stage(tournament_id: int, bracket: List[StageDef]):
+    """Переход к следующему этапу плей-офф."""
+    stages_df = get_all_stages(tournament_id)
+    active = stages_df[stages_df["status"] == "active"]
+    if active.empty:
+        return
+    cur = active.iloc[0]
+    cur_idx = int(cur["stage_idx"])
+    next_idx = cur_idx + 1
+    if next_idx >= len(bracket):
+        return
+
+    # Получаем дисциплину и scoring_mode
+    tourn_info = q_one("SELECT discipline, scoring_mode FROM tournaments WHERE id=?", (tournament_id,))
+    disc = str(tourn_info["discipline"]) if tourn_info is not None else "drone_individual"
+    sm = str(tourn_info["scoring_mode"]) if tourn_info is not None else "none"
+
+    # Валидация: проверить, что все результаты текущего этапа заполнены
+    cur_sd = bracket[cur_idx]
+    ok, msg = check_stage_results_complete(int(cur["id"]), cur_sd, disc, sm)
+    if not ok:
+        raise ValueError(msg)
+
+    next_sd = bracket[next_idx]
+    with transaction():
+        next_stage_id = create_stage(tournament_id, next_idx, next_sd)
+
+        if next_sd.progress_map:
+            gid_by_no = {int(r["group_no"]): int(r["id"])
+                         for r in q_rows("SELECT id, group_no FROM groups WHERE stage_id=?", (next_stage_id,))}
+
+            # Рейтинги всех групп текущего этапа — один раз, а не на каждую ссылку (место, группа)
+            rankings = compute_stage_rankings(int(cur["id"]), disc, sm)
+            rows = []
+            for target_gno, refs in next_sd.progress_map.items():
+                for (place, src_gno) in refs:
+                    ranking = rankings.get(src_gno, pd.DataFrame())
+                    if not ranking.empty and len(ranking) >= place:
+                        # pid column name can differ between drone and sim ranking DataFrames
+                        pid_col = "participant_id" if "participant_id" in ranking.columns else "pid"
+                        pid = int(ranking.iloc[place - 1][pid_col])
+                        rows.append((gid_by_no[target_gno], pid))
+
+            exec_many("INSERT OR IGNORE INTO group_members(group_id, participant_id) VALUES(?,?)", rows)
+            refresh_stage_progress(next_stage_id)
+
+        exec_sql("UPDATE stages SET status='done' WHERE id=?", (int(cur["id"]),))
+
+
+# Поддерево этапов в порядке удаления (сначала дочерние таблицы). Удаление явное,
+# по оператору на таблицу, а не каскадом FK: так известно число строк по каждой
+# таблице, и материализованные group_progress/group_standings чистятся вместе с этапом.
+_STAGE_SUBTREE_DELETES = [
+    ("heat_results", """DELETE FROM heat_results WHERE heat_id IN (
+                            SELECT h.id FROM heats h JOIN groups g ON g.id=h.group_id
+                            WHERE g.stage_id IN ({}))"""),
+    ("heats", "DELETE FROM heats WHERE group_id IN (SELECT id FROM groups WHERE stage_id IN ({}))"),
+    ("group_members", "DELETE FROM group_members WHERE group_id IN (SELECT id FROM groups WHERE stage_id IN ({}))"),
+    ("group_progress", "DELETE FROM group_progress WHERE stage_id IN ({})"),
+    ("group_standings", "DELETE FROM group_standings WHERE stage_id IN ({})"),
+    ("groups", "DELETE FROM groups WHERE stage_id IN ({})"),
+    ("stages", "DELETE FROM stages WHERE id IN ({})"),
+]
+
+
+def delete_stages(stage_ids: List[int]) -> Dict[str, int]:
+    """Удаляет этапы со всеми группами, вылетами и результатами — по одному
+    оператору на таблицу, в одной транзакции. Возвращает {таблица: удалено строк}."""
+    stage_ids = [int(s) for s in stage_ids]
+    if not stage_ids:
+        return {table: 0 for table, _ in _STAGE_SUBTREE_DELETES}
+    placeholders = ",".join("?" * len(stage_ids))
+    with transaction():
+        return {table: exec_sql(sql.format(placeholders), stage_ids)
+                for table, sql in _STAGE_SUBTREE_DELETES}
+
+
+def delete_tournament(tournament_id: int) -> Dict[str, int]:
+    """Удаляет турнир целиком одной транзакцией. Возвращает {таблица: удалено строк}."""
+    with transaction():
+        stage_ids = [int(r["id"]) for r in q_rows("SELECT id FROM stages WHERE tournament_id=?", (tournament_id,))]
+        removed = delete_stages(stage_ids)
+        removed["tournament_standings"] = exec_sql(
+            "DELETE FROM tournament_standings WHERE tournament_id=?", (tournament_id,))
+        removed["team_pilots"] = exec_sql(
+            "DELETE FROM team_pilots WHERE participant_id IN (SELECT id FROM participants WHERE tournament_id=?)",
+            (tournament_id,))
+        removed["qualification_results"] = exec_sql(
+            "DELETE FROM qualification_results WHERE tournament_id=?", (tournament_id,))
+        removed["participants"] = exec_sql("DELETE FROM participants WHERE tournament_id=?", (tournament_id,))
+        removed["tournaments"] = exec_sql("DELETE FROM tournaments WHERE id=?", (tournament_id,))
+        # Отметку ставят триггеры удалений выше
+        exec_sql("DELETE FROM tournament_standings_dirty WHERE tournament_id=?", (tournament_id,))
+    return removed
+
+
+def rollback_to_previous_stage(tournament_id: int, bracket: List[StageDef]) -> Dict[str, int]:
+    """Откат на предыдущий этап: удаляет текущий активный этап и реактивирует предыдущий.
+    Возвращает число удалённых строк по таблицам (пусто, если ничего не удалялось)."""
+    with transaction():
+        stages_df = get_all_stages(tournament_id)
+
+        # Если турнир завершён — снимаем статус finished и реактивируем финал
+        tourn = get_tournament(tournament_id)
+        if str(tourn["status"]) == "finished":
+            # Находим последний этап (финал)
+            last = stages_df[stages_df["status"] == "done"].sort_values("stage_idx", ascending=False)
+            if not last.empty:
+                last_id = int(last.iloc[0]["id"])
+                exec_sql("UPDATE stages SET status='active' WHERE id=?", (last_id,))
+                exec_sql("UPDATE tournaments SET status='bracket' WHERE id=?", (tournament_id,))
+            return {}
+
+        active = stages_df[stages_df["status"] == "active"]
+        if active.empty:
+            return {}
+        cur = active.iloc[0]
+        cur_idx = int(cur["stage_idx"])
+
+        # Удаляем все данные текущего этапа
+        removed = delete_stages([int(cur["id"])])
+        if cur_idx == 0:
+            # Первый этап — откатываемся в квалификацию
+            exec_sql("UPDATE tournaments SET status='qualification', bracket_json=NULL WHERE id=?",
+                     (tournament_id,))
+        else:
+            # Реактивируем предыдущий
+            prev = stages_df[stages_df["stage_idx"] == cur_idx - 1]
+            if not prev.empty:
+                exec_sql("UPDATE stages SET status='active' WHERE id=?", (int(prev.iloc[0]["id"]),))
+        return removed
+
+
+def start_bracket(tournament_id: int):
+    """Завершить квалификацию и создать первый этап плей-офф."""
+    ranking = get_qual_ranking(tournament_id)
+    n = len(ranking)
+    advancing = compute_bracket_size(n)
+    bracket = generate_bracket(advancing)
+
+    with transaction():
+        # Сетка фиксируется в БД: дальнейшие изменения квалификации её не меняют
+        exec_sql("UPDATE tournaments SET status='bracket', bracket_json=? WHERE id=?",
+                 (bracket_to_json(bracket), tournament_id))
+
+        # Создаём первый этап
+        first_sd = bracket[0]
+        stage_id = create_stage(tournament_id, 0, first_sd)
+
+        # Посев
+        if first_sd.seeding_map:
+            seed_groups_from_qual(tournament_id, stage_id, first_sd.seeding_map, advancing)
+
+
+def finish_tournament(tournament_id: int, final_stage_id: int):
+    """Закрывает финальный этап и помечает турнир завершённым (одной транзакцией)."""
+    with transaction():
+        exec_sql("UPDATE stages SET status='done' WHERE id=?", (final_stage_id,))
+        exec_sql("UPDATE tournaments SET status='finished' WHERE id=?", (tournament_id,))
+
+
+@request_memo
+def get_bracket_for_tournament(tournament_id: int) -> List[StageDef]:
+    """Сетка турнира: сохранённая при старте плей-офф, до старта — предварительная
+    по текущей квалификации."""
+    data = q_scalar("SELECT bracket_json FROM tournaments WHERE id=?", (tournament_id,))
+    if data:
+        return bracket_from_json(data)
+    bracket = derive_bracket(tournament_id)
+    if bracket and q_scalar("SELECT 1 FROM stages WHERE tournament_id=? LIMIT 1", (tournament_id,)):
+        # Турнир до миграции 8: этапы уже есть, фиксируем выведенную сетку
+        save_bracket(tournament_id, bracket)
+    return bracket
+
+
+def save_bracket(tournament_id: int, bracket: Optional[List[StageDef]]):
+    """Сохраняет сетку турнира (None — сбросить, сетка снова выводится из квалификации)."""
+    exec_sql("UPDATE tournaments SET bracket_json=? WHERE id=?",
+             (bracket_to_json(bracket) if bracket else None, tournament_id))
+
+
+def rederive_bracket(tournament_id: int) -> List[StageDef]:
+    """Явный пересчёт сетки по текущей квалификации с перезаписью сохранённой."""
+    bracket = derive_bracket(tournament_id)
+    save_bracket(tournament_id, bracket)
+    return bracket
+
+
+def derive_bracket(tournament_id: int) -> List[StageDef]:
+    """Определяет сетку по количеству прошедших квалификацию."""
+    ranking = get_qual_ranking(tournament_id)
+    n = len(ranking)
+    if n == 0:
+        # Проверяем если уже есть этапы — восстанавливаем по кол-ву участников первого этапа
+        stages = get_all_stages(tournament_id)
+        if not stages.empty:
+            first = stages.iloc[0]
+            total = int(first["group_size"]) * int(first["group_count"])
+            return generate_bracket(total)
+        return []
+    advancing = compute_bracket_size(n)
+    return generate_bracket(advancing)
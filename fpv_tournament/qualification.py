@@ -0,0 +1,171 @@
+"""Квалификация: попытки, рейтинг, дисквалификация; форматирование времени."""
+import math
+from typing import Dict, FrozenSet, List, Optional
+
+import pandas as pd
+
+from .database import exec_sql, q_rows, q_scalar, qdf, request_memo, shared_cache
+from .dependencies import dsq_nodes, qualification_nodes
+from .ranking import TIE_ORDER, rank_frame
+
+
+def calc_projected_time(time_seconds: float, laps_completed: float, total_laps: int = 3) -> Optional[float]:
+    """Рассчитать теоретическое время на total_laps кругов."""
+    if laps_completed and laps_completed > 0:
+        return round(time_seconds * (total_laps / laps_completed), 2)
+    return None
+
+
+def safe_time_for_input(seconds: float) -> float:
+    """Для number_input(max_value=999): 9999 (DSQ sentinel), NaN и больше -> 0."""
+    if seconds is None or (isinstance(seconds, float) and math.isnan(seconds)) or seconds > 999:
+        return 0.0
+    return float(seconds)
+
+
+def rank_results(results: List[Dict], ties: str = TIE_ORDER) -> List[Dict]:
+    """
+    Ранжирование по времени:
+    1. Пролетели все круги → по time_seconds ASC
+    2. Не долетели → по laps_completed DESC
+    Равные результаты — по политике ties (по умолчанию порядок ввода). Проставляет place.
+    """
+    if not results:
+        return []
+    df = pd.DataFrame({
+        "done": [1 if r.get("completed_all_laps") else 0 for r in results],
+        "score": [(r.get("time_seconds") or 9999) if r.get("completed_all_laps")
+                  else -(r.get("laps_completed") or 0) for r in results],
+    })
+    ranked = rank_frame(df, [("done", False), ("score", True)], ties=ties)
+    out = []
+    for idx, place in zip(ranked.index, ranked["place"]):
+        r = results[idx]
+        r["place"] = int(place)
+        out.append(r)
+    return out
+
+
+def get_qualification_results(tournament_id: int) -> pd.DataFrame:
+    """Получить результаты квалификации с ранжированием."""
+    df = get_qual_ranking(tournament_id)
+    return df
+
+
+def get_participant_qual_attempts(tournament_id: int, participant_id: int) -> pd.DataFrame:
+    """Получить все попытки квалификации участника."""
+    return qdf("""
+        SELECT attempt_no, time_seconds, laps_completed, completed_all_laps, projected_time
+        FROM qualification_results
+        WHERE tournament_id=? AND participant_id=? AND time_seconds IS NOT NULL
+        ORDER BY attempt_no
+    """, (tournament_id, participant_id))
+
+
+@shared_cache(qualification_nodes)
+def get_qual_ranking(tournament_id: int) -> pd.DataFrame:
+    """Ранжированный список квалификации. При нескольких попытках — берётся лучший результат.
+    Порядок как в rank_results: пролетевшие все круги по времени (0/NULL = 9999), остальные
+    по кругам DESC; дисквалифицированные — в конце. Равенство — по номеру попытки / id участника."""
+    return qdf("""
+        WITH attempts AS (
+            SELECT p.id as pid, p.name, p.start_number,
+                   qr.attempt_no, qr.time_seconds, qr.laps_completed, qr.completed_all_laps, qr.projected_time,
+                   COALESCE(p.disqualified,0) as disqualified,
+                   CASE WHEN qr.completed_all_laps THEN 1 ELSE 0 END as done,
+                   CASE WHEN qr.completed_all_laps THEN COALESCE(NULLIF(qr.time_seconds, 0), 9999)
+                        ELSE -COALESCE(qr.laps_completed, 0) END as score
+            FROM participants p
+            JOIN qualification_results qr ON qr.participant_id = p.id AND qr.tournament_id = ?
+            WHERE p.tournament_id = ? AND qr.time_seconds IS NOT NULL
+        ),
+        best AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY pid ORDER BY done DESC, score, attempt_no) as rn
+            FROM attempts
+        )
+        SELECT pid, name, start_number, attempt_no, time_seconds, laps_completed, completed_all_laps,
+               projected_time, disqualified,
+               ROW_NUMBER() OVER (ORDER BY disqualified, done DESC, score, pid) as place
+        FROM best
+        WHERE rn = 1
+        ORDER BY place
+    """, (tournament_id, tournament_id))
+
+
+def save_qual_result(tournament_id: int, participant_id: int, time_seconds: float,
+                     laps_completed: float, completed_all_laps: bool, total_laps: int = 3, attempt_no: int = 1):
+    projected = calc_projected_time(time_seconds, laps_completed, total_laps) if not completed_all_laps else time_seconds
+    exec_sql("""
+        INSERT OR REPLACE INTO qualification_results(tournament_id, participant_id, attempt_no,
+            time_seconds, laps_completed, completed_all_laps, projected_time)
+        VALUES(?, ?, ?, ?, ?, ?, ?)
+    """, (tournament_id, participant_id, attempt_no, time_seconds, laps_completed,
+          int(completed_all_laps), projected))
+
+
+def participant_count(tournament_id: int) -> int:
+    return int(q_scalar("SELECT COUNT(*) FROM participants WHERE tournament_id=?", (tournament_id,), 0))
+
+
+@shared_cache(dsq_nodes)
+@request_memo
+def get_disqualified_pids(tournament_id: int) -> FrozenSet[int]:
+    """Множество id дисквалифицированных участников турнира. Загружается один раз на версию
+    узла dsq:<tid>, которую меняет только запись флага disqualified, и общее для всех сессий."""
+    rows = q_rows("SELECT id FROM participants WHERE tournament_id=? AND COALESCE(disqualified,0)=1",
+                  (tournament_id,))
+    return frozenset(int(r["id"]) for r in rows)
+
+
+def _apply_dsq_to_ranking(df: pd.DataFrame, tournament_id: int, pid_col: str = "pid") -> pd.DataFrame:
+    """Перемещает дисквалифицированных участников в конец таблицы и пересчитывает места."""
+    if df.empty:
+        return df
+    dsq_pids = get_disqualified_pids(tournament_id)
+    if not dsq_pids:
+        return df
+    pid_name = pid_col if pid_col in df.columns else "participant_id"
+    if pid_name not in df.columns:
+        return df
+    non_dsq = df[~df[pid_name].isin(dsq_pids)]
+    dsq_rows = df[df[pid_name].isin(dsq_pids)]
+    if dsq_rows.empty:
+        return df
+    combined = pd.concat([non_dsq, dsq_rows], ignore_index=True)
+    if "rank" in combined.columns:
+        combined["rank"] = range(1, len(combined) + 1)
+    elif "place" in combined.columns:
+        combined["place"] = range(1, len(combined) + 1)
+    return combined.reset_index(drop=True)
+
+
+@request_memo
+def get_tournament(tournament_id: int) -> Optional[pd.Series]:
+    df = qdf("SELECT * FROM tournaments WHERE id=?", (tournament_id,))
+    return df.iloc[0] if not df.empty else None
+
+
+def format_time(seconds: Optional[float]) -> str:
+    """Форматирует секунды в мм:сс.мс"""
+    if seconds is None or (isinstance(seconds, float) and math.isnan(seconds)):
+        return "—"
+    m = int(seconds) // 60
+    s = seconds - m * 60
+    return f"{m}:{s:06.3f}"
+
+
+def parse_time(time_str: str) -> Optional[float]:
+    """Парсит время из строки (поддержка форматов: 90.5, 1:30.5)"""
+    if not time_str or time_str.strip() == "":
+        return None
+    time_str = time_str.strip().replace(",", ".")
+    if ":" in time_str:
+        parts = time_str.split(":")
+        try:
+            return float(parts[0]) * 60 + float(parts[1])
+        except ValueError:
+            return None
+    try:
+        return float(time_str)
+    except ValueError:
+        return None
@@ -0,0 +1,67 @@
+"""Ранжирование по нескольким ключам на столбцах (numpy.lexsort) с явной политикой ничьих."""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Политики ничьих (строки, равные по всем ключам сортировки):
+TIE_ORDER = "order"    # разводятся исходным порядком строк: места 1, 2, 3, 4
+TIE_SHARED = "shared"  # делят место: 1, 2, 2, 4
+# Развести ничью следующим ключом — просто добавить его в конец keys.
+
+
+def _key_array(values: pd.Series, ascending: bool) -> np.ndarray:
+    """Столбец как массив для lexsort: меньше — лучше, NaN — в конце."""
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        arr = values.to_numpy(dtype=float, na_value=np.nan)
+    else:
+        codes, _ = pd.factorize(values, sort=True)
+        arr = np.where(codes < 0, np.nan, codes.astype(float))
+    return arr if ascending else -arr
+
+
+def rank_frame(df: pd.DataFrame, keys: Sequence[Tuple[str, bool]], partition: Optional[str] = None,
+               ties: str = TIE_ORDER) -> pd.DataFrame:
+    """Сортирует df по keys = [(столбец, по возрастанию), ...] одним lexsort — внутри каждой
+    партиции (partition: столбец, например heat_id), если задан — и добавляет столбцы:
+    place — место в партиции по политике ties; tie_group — номер группы строк, равных по всем
+    ключам (0, 1, ... в порядке мест), -1 — без ничьей. Индекс строк сохраняется."""
+    if ties not in (TIE_ORDER, TIE_SHARED):
+        raise ValueError(f"Неизвестная политика ничьих: {ties}")
+    n = len(df)
+    if n == 0:
+        return df.assign(place=pd.Series(dtype=int), tie_group=pd.Series(dtype=int))
+
+    arrays = [_key_array(df[col], asc) for col, asc in keys]
+    part = pd.factorize(df[partition], sort=True)[0] if partition else np.zeros(n, dtype=int)
+    # lexsort: последний ключ — главный; исходная позиция — последний довод
+    order = np.lexsort([np.arange(n)] + arrays[::-1] + [part])
+    arrays = [a[order] for a in arrays]
+    part = part[order]
+
+    pos = np.arange(n)
+    part_start = np.ones(n, dtype=bool)
+    part_start[1:] = part[1:] != part[:-1]
+    run_start = part_start.copy()
+    for a in arrays:
+        same = (a[1:] == a[:-1]) | (np.isnan(a[1:]) & np.isnan(a[:-1]))
+        run_start[1:] |= ~same
+    first_in_part = np.maximum.accumulate(np.where(part_start, pos, 0))
+    first_in_run = np.maximum.accumulate(np.where(run_start, pos, 0))
+    place = (first_in_run if ties == TIE_SHARED else pos) - first_in_part + 1
+
+    run_id = np.cumsum(run_start) - 1
+    tied = np.bincount(run_id)[run_id] > 1
+    tie_group = np.full(n, -1)
+    tie_group[tied] = pd.factorize(run_id[tied])[0]
+
+    out = df.iloc[order].copy()
+    out["place"] = place
+    out["tie_group"] = tie_group
+    return out
+
+
+def tie_groups(ranked: pd.DataFrame, id_col: str) -> List[List[int]]:
+    """Группы ничьих из результата rank_frame: [[id, ...], ...] в порядке мест."""
+    tied = ranked[ranked["tie_group"] >= 0]
+    return [[int(x) for x in sub[id_col]] for _, sub in tied.groupby("tie_group", sort=True)]
@@ -0,0 +1,544 @@
+"""Схема БД: упорядоченные миграции и init_db()."""
+import sqlite3
+from typing import List
+
+from .database import connection, transaction
+
+
+def _table_columns(c, table: str) -> List[str]:
+    return [row[1] for row in c.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _migration_1_base_schema(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS tournaments(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        discipline TEXT NOT NULL DEFAULT 'drone_individual',
+        time_limit_seconds REAL NOT NULL DEFAULT 90.0,
+        total_laps INTEGER NOT NULL DEFAULT 3,
+        scoring_mode TEXT NOT NULL DEFAULT 'none',
+        status TEXT NOT NULL DEFAULT 'setup',
+        created_at TEXT NOT NULL
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS participants(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tournament_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        start_number INTEGER,
+        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS qualification_results(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tournament_id INTEGER NOT NULL,
+        participant_id INTEGER NOT NULL,
+        time_seconds REAL,
+        laps_completed REAL,
+        completed_all_laps INTEGER DEFAULT 0,
+        projected_time REAL,
+        UNIQUE(tournament_id, participant_id),
+        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE,
+        FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS stages(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tournament_id INTEGER NOT NULL,
+        stage_idx INTEGER NOT NULL,
+        code TEXT NOT NULL,
+        group_size INTEGER NOT NULL,
+        group_count INTEGER NOT NULL,
+        qualifiers INTEGER NOT NULL,
+        heats_count INTEGER NOT NULL DEFAULT 1,
+        status TEXT NOT NULL DEFAULT 'active',
+        UNIQUE(tournament_id, stage_idx),
+        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS groups(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        stage_id INTEGER NOT NULL,
+        group_no INTEGER NOT NULL,
+        UNIQUE(stage_id, group_no),
+        FOREIGN KEY(stage_id) REFERENCES stages(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS group_members(
+        group_id INTEGER NOT NULL,
+        participant_id INTEGER NOT NULL,
+        PRIMARY KEY(group_id, participant_id),
+        FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE,
+        FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS heats(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_id INTEGER NOT NULL,
+        heat_no INTEGER NOT NULL,
+        track_no INTEGER NOT NULL DEFAULT 1,
+        UNIQUE(group_id, track_no, heat_no),
+        FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS heat_results(
+        heat_id INTEGER NOT NULL,
+        participant_id INTEGER NOT NULL,
+        time_seconds REAL,
+        laps_completed REAL,
+        completed_all_laps INTEGER DEFAULT 0,
+        projected_time REAL,
+        place INTEGER,
+        points INTEGER DEFAULT 0,
+        PRIMARY KEY(heat_id, participant_id),
+        FOREIGN KEY(heat_id) REFERENCES heats(id) ON DELETE CASCADE,
+        FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+    )""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS team_pilots(
+        participant_id INTEGER PRIMARY KEY,
+        pilot1_name TEXT NOT NULL,
+        pilot2_name TEXT NOT NULL,
+        FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+    )""")
+
+
+def _migration_2_added_columns(c):
+    # Столбцы, добавленные после первых версий (для обновления старых БД)
+    if "scoring_mode" not in _table_columns(c, "tournaments"):
+        c.execute("ALTER TABLE tournaments ADD COLUMN scoring_mode TEXT NOT NULL DEFAULT 'none'")
+    if "disqualified" not in _table_columns(c, "participants"):
+        c.execute("ALTER TABLE participants ADD COLUMN disqualified INTEGER NOT NULL DEFAULT 0")
+    if "qual_attempts" not in _table_columns(c, "tournaments"):
+        c.execute("ALTER TABLE tournaments ADD COLUMN qual_attempts INTEGER NOT NULL DEFAULT 1")
+
+
+def _migration_3_qual_attempts(c):
+    # qualification_results: добавить attempt_no для нескольких попыток
+    if "attempt_no" not in _table_columns(c, "qualification_results"):
+        c.execute("""CREATE TABLE qualification_results_new(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tournament_id INTEGER NOT NULL,
+            participant_id INTEGER NOT NULL,
+            attempt_no INTEGER NOT NULL DEFAULT 1,
+            time_seconds REAL,
+            laps_completed REAL,
+            completed_all_laps INTEGER DEFAULT 0,
+            projected_time REAL,
+            UNIQUE(tournament_id, participant_id, attempt_no),
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE,
+            FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+        )""")
+        c.execute("""INSERT INTO qualification_results_new(id, tournament_id, participant_id, attempt_no,
+            time_seconds, laps_completed, completed_all_laps, projected_time)
+            SELECT id, tournament_id, participant_id, 1, time_seconds, laps_completed, completed_all_laps, projected_time
+            FROM qualification_results""")
+        c.execute("DROP TABLE qualification_results")
+        c.execute("ALTER TABLE qualification_results_new RENAME TO qualification_results")
+
+
+def _migration_4_heats_track_no(c):
+    # heats: пересоздаём таблицу с правильным UNIQUE constraint
+    # Проверяем, есть ли столбец track_no и правильный ли constraint
+    if "track_no" not in _table_columns(c, "heats"):
+        # Старая таблица без track_no — пересоздаём
+        c.execute("""CREATE TABLE IF NOT EXISTS heats_new(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            heat_no INTEGER NOT NULL,
+            track_no INTEGER NOT NULL DEFAULT 1,
+            UNIQUE(group_id, track_no, heat_no),
+            FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE
+        )""")
+        c.execute("INSERT INTO heats_new(id, group_id, heat_no, track_no) SELECT id, group_id, heat_no, 1 FROM heats")
+        c.execute("DROP TABLE heats")
+        c.execute("ALTER TABLE heats_new RENAME TO heats")
+    else:
+        # track_no есть, но возможно constraint старый — проверяем
+        # Пробуем вставить тестовую запись, которая бы нарушила старый constraint
+        # Безопаснее: пересоздать если autoindex всё ещё старый
+        index_info = c.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='heats'").fetchone()
+        if index_info and "UNIQUE(group_id, heat_no)" in (index_info[0] or ""):
+            c.execute("""CREATE TABLE IF NOT EXISTS heats_new(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_id INTEGER NOT NULL,
+                heat_no INTEGER NOT NULL,
+                track_no INTEGER NOT NULL DEFAULT 1,
+                UNIQUE(group_id, track_no, heat_no),
+                FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE
+            )""")
+            c.execute("INSERT INTO heats_new(id, group_id, heat_no, track_no) SELECT id, group_id, heat_no, track_no FROM heats")
+            c.execute("DROP TABLE heats")
+            c.execute("ALTER TABLE heats_new RENAME TO heats")
+
+
+def _migration_5_secondary_indexes(c):
+    # Вторичные индексы под частые выборки. Поиск heats по group_id уже покрыт
+    # UNIQUE(group_id, track_no, heat_no), остальные UNIQUE/PK — по первым столбцам.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_participants_tournament "
+              "ON participants(tournament_id, start_number)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_qual_results_participant "
+              "ON qualification_results(participant_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_group_members_participant "
+              "ON group_members(participant_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_heat_results_participant "
+              "ON heat_results(participant_id)")
+
+
+# Таблицы с данными турниров, на которые миграция 6 ставила триггеры токена поколения.
+# Миграция 10 эти триггеры удаляет: записи токен больше не меняют (см. db_generation_token).
+DATA_TABLES = ("tournaments", "participants", "qualification_results", "stages", "groups",
+               "group_members", "heats", "heat_results", "team_pilots")
+
+
+def _create_generation_triggers(c, tables):
+    for table in tables:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_generation_{table}_{op.lower()}
+                AFTER {op} ON {table}
+                BEGIN UPDATE db_generation SET token = random() WHERE id = 1; END""")
+
+
+def _migration_6_generation_token(c):
+    # Токен поколения для межсессионного кэша: случайное значение, которое триггеры
+    # перезаписывают при каждом изменении данных (в т.ч. из другого процесса).
+    c.execute("""CREATE TABLE IF NOT EXISTS db_generation(
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        token INTEGER NOT NULL
+    )""")
+    c.execute("INSERT OR IGNORE INTO db_generation(id, token) VALUES(1, random())")
+    _create_generation_triggers(c, DATA_TABLES)
+
+
+def _migration_7_group_progress(c):
+    # Прогресс групп, поддерживаемый при записи: сколько вылетов ожидается/заполнено,
+    # каких не хватает и какие ничьи на границе прохода не разрешены.
+    c.execute("""CREATE TABLE IF NOT EXISTS group_progress(
+        group_id INTEGER PRIMARY KEY,
+        stage_id INTEGER NOT NULL,
+        members INTEGER NOT NULL DEFAULT 0,
+        expected_heats INTEGER NOT NULL DEFAULT 0,
+        filled_heats INTEGER NOT NULL DEFAULT 0,
+        missing TEXT NOT NULL DEFAULT '[]',
+        unresolved_ties INTEGER NOT NULL DEFAULT 0,
+        tied_pids TEXT NOT NULL DEFAULT '[]',
+        FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_group_progress_stage ON group_progress(stage_id)")
+
+
+def _migration_8_bracket_json(c):
+    # Сетка плей-офф фиксируется при старте и больше не выводится из квалификации.
+    # Для старых турниров столбец пуст и заполняется при первом чтении.
+    if "bracket_json" not in _table_columns(c, "tournaments"):
+        c.execute("ALTER TABLE tournaments ADD COLUMN bracket_json TEXT")
+
+
+# Что влияет на общую итоговую таблицу турнира: (таблица, операция, выражение tournament_id).
+# Имена участников читаются при выводе, поэтому переименование таблицу не сбрасывает.
+STANDINGS_SOURCES = [
+    ("participants", "INSERT", "NEW.tournament_id"),
+    ("participants", "DELETE", "OLD.tournament_id"),
+    ("participants", "UPDATE OF disqualified, start_number", "NEW.tournament_id"),
+    ("qualification_results", "INSERT", "NEW.tournament_id"),
+    ("qualification_results", "UPDATE", "NEW.tournament_id"),
+    ("qualification_results", "DELETE", "OLD.tournament_id"),
+    ("stages", "INSERT", "NEW.tournament_id"),
+    ("stages", "DELETE", "OLD.tournament_id"),
+    ("tournaments", "UPDATE OF bracket_json, discipline, scoring_mode", "NEW.id"),
+    ("group_standings", "INSERT", "(SELECT tournament_id FROM stages WHERE id=NEW.stage_id)"),
+    ("group_standings", "UPDATE", "(SELECT tournament_id FROM stages WHERE id=NEW.stage_id)"),
+    ("group_standings", "DELETE", "(SELECT tournament_id FROM stages WHERE id=OLD.stage_id)"),
+]
+
+
+def _create_standings_triggers(c):
+    for table, op, tid_expr in STANDINGS_SOURCES:
+        name = op.split()[0].lower()
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_standings_{table}_{name}
+            AFTER {op} ON {table}
+            BEGIN DELETE FROM tournament_standings WHERE tournament_id = {tid_expr}; END""")
+
+
+def _migration_9_standings_tables(c):
+    # Материализованные рейтинги. group_standings пишется вместе с group_progress при
+    # каждой записи в группу; tournament_standings сбрасывается триггерами и
+    # пересобирается из group_standings и квалификации при первом чтении.
+    c.execute("""CREATE TABLE IF NOT EXISTS group_standings(
+        group_id INTEGER NOT NULL,
+        stage_id INTEGER NOT NULL,
+        participant_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        total_points INTEGER,
+        wins INTEGER,
+        heats_played INTEGER,
+        time_seconds REAL,
+        projected_time REAL,
+        heat_place INTEGER,
+        PRIMARY KEY(group_id, participant_id),
+        FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE CASCADE,
+        FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_group_standings_stage ON group_standings(stage_id, group_id, rank)")
+    c.execute("""CREATE TABLE IF NOT EXISTS tournament_standings(
+        tournament_id INTEGER NOT NULL,
+        place INTEGER NOT NULL,
+        participant_id INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        detail TEXT NOT NULL,
+        is_dsq INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY(tournament_id, place),
+        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE,
+        FOREIGN KEY(participant_id) REFERENCES participants(id) ON DELETE CASCADE
+    )""")
+    _create_standings_triggers(c)
+    # Группы без записи прогресса досчитываются при чтении — вместе с рейтингом
+    c.execute("DELETE FROM group_progress")
+
+
+# Какие узлы графа зависимостей (см. dependencies.py) сбрасывает запись:
+# (таблица, событие, SELECT имён узлов (столбец node) по строке NEW/OLD).
+_PARTICIPANT_NODES = """SELECT 'qual:' || {row}.tournament_id AS node
+    UNION SELECT 'stage:' || g.stage_id FROM group_members gm JOIN groups g ON g.id=gm.group_id
+    WHERE gm.participant_id={row}.id"""
+NODE_SOURCES = [
+    ("tournaments", "AFTER UPDATE", "SELECT 'tournament:' || NEW.id AS node"),
+    ("tournaments", "AFTER DELETE", "SELECT 'tournament:' || OLD.id AS node"),
+    ("participants", "AFTER INSERT", "SELECT 'qual:' || NEW.tournament_id AS node"),
+    ("participants", "AFTER UPDATE", _PARTICIPANT_NODES.format(row="NEW")),
+    # До удаления: каскад FK уберёт строки group_members, по которым ищутся этапы
+    ("participants", "BEFORE DELETE", _PARTICIPANT_NODES.format(row="OLD")),
+    ("qualification_results", "AFTER INSERT", "SELECT 'qual:' || NEW.tournament_id AS node"),
+    ("qualification_results", "AFTER UPDATE", "SELECT 'qual:' || NEW.tournament_id AS node"),
+    ("qualification_results", "AFTER DELETE", "SELECT 'qual:' || OLD.tournament_id AS node"),
+    ("team_pilots", "AFTER INSERT", "SELECT 'qual:' || tournament_id AS node FROM participants "
+                                    "WHERE id=NEW.participant_id"),
+    ("team_pilots", "AFTER UPDATE", "SELECT 'qual:' || tournament_id AS node FROM participants "
+                                    "WHERE id=NEW.participant_id"),
+    ("team_pilots", "AFTER DELETE", "SELECT 'qual:' || tournament_id AS node FROM participants "
+                                    "WHERE id=OLD.participant_id"),
+    ("stages", "AFTER INSERT", "SELECT 'tournament:' || NEW.tournament_id AS node UNION SELECT 'stage:' || NEW.id"),
+    ("stages", "AFTER UPDATE", "SELECT 'tournament:' || NEW.tournament_id AS node UNION SELECT 'stage:' || NEW.id"),
+    ("stages", "AFTER DELETE", "SELECT 'tournament:' || OLD.tournament_id AS node UNION SELECT 'stage:' || OLD.id"),
+    ("groups", "AFTER INSERT", "SELECT 'stage:' || NEW.stage_id AS node"),
+    ("groups", "AFTER UPDATE", "SELECT 'stage:' || NEW.stage_id AS node"),
+    ("groups", "AFTER DELETE", "SELECT 'stage:' || OLD.stage_id AS node"),
+    ("group_members", "AFTER INSERT", "SELECT 'stage:' || stage_id AS node FROM groups WHERE id=NEW.group_id"),
+    ("group_members", "AFTER UPDATE", "SELECT 'stage:' || stage_id AS node FROM groups WHERE id=NEW.group_id"),
+    ("group_members", "AFTER DELETE", "SELECT 'stage:' || stage_id AS node FROM groups WHERE id=OLD.group_id"),
+    ("heats", "AFTER INSERT", "SELECT 'stage:' || stage_id AS node FROM groups WHERE id=NEW.group_id"),
+    ("heats", "AFTER UPDATE", "SELECT 'stage:' || stage_id AS node FROM groups WHERE id=NEW.group_id"),
+    ("heats", "AFTER DELETE", "SELECT 'stage:' || stage_id AS node FROM groups WHERE id=OLD.group_id"),
+    ("heat_results", "AFTER INSERT", "SELECT 'stage:' || g.stage_id AS node FROM heats h "
+                                     "JOIN groups g ON g.id=h.group_id WHERE h.id=NEW.heat_id"),
+    ("heat_results", "AFTER UPDATE", "SELECT 'stage:' || g.stage_id AS node FROM heats h "
+                                     "JOIN groups g ON g.id=h.group_id WHERE h.id=NEW.heat_id"),
+    ("heat_results", "AFTER DELETE", "SELECT 'stage:' || g.stage_id AS node FROM heats h "
+                                     "JOIN groups g ON g.id=h.group_id WHERE h.id=OLD.heat_id"),
+]
+
+
+def _create_node_triggers(c):
+    for table, event, nodes_sql in NODE_SOURCES:
+        name = event.split()[1].lower()
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_nodes_{table}_{name}
+            {event} ON {table}
+            BEGIN
+                INSERT INTO node_versions(node, version) SELECT node, random() FROM ({nodes_sql})
+                WHERE node IS NOT NULL
+                ON CONFLICT(node) DO UPDATE SET version = excluded.version;
+            END""")
+
+
+def _migration_10_node_versions(c):
+    # Версии узлов графа зависимостей вместо одного токена поколения: запись сбрасывает
+    # кэш только затронутых этапов и турнира. Токен остаётся идентификатором файла БД.
+    c.execute("""CREATE TABLE IF NOT EXISTS node_versions(
+        node TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+    for table in DATA_TABLES:
+        for op in ("insert", "update", "delete"):
+            c.execute(f"DROP TRIGGER IF EXISTS trg_generation_{table}_{op}")
+    _create_node_triggers(c)
+
+
+# Журнал изменений: (таблица, выражение tournament_id, выражение ключа строки) по NEW/OLD.
+CHANGE_LOG_SOURCES = [
+    ("heat_results",
+     "(SELECT s.tournament_id FROM heats h JOIN groups g ON g.id=h.group_id "
+     "JOIN stages s ON s.id=g.stage_id WHERE h.id={row}.heat_id)",
+     "{row}.heat_id || ':' || {row}.participant_id"),
+    ("qualification_results", "{row}.tournament_id", "{row}.id"),
+    ("participants", "{row}.tournament_id", "{row}.id"),
+    ("group_members",
+     "(SELECT s.tournament_id FROM groups g JOIN stages s ON s.id=g.stage_id WHERE g.id={row}.group_id)",
+     "{row}.group_id || ':' || {row}.participant_id"),
+    ("stages", "{row}.tournament_id", "{row}.id"),
+]
+
+# Политика сжатия: на каждой CHANGE_LOG_COMPACT_EVERY-й записи журнала удаляются все,
+# кроме последних CHANGE_LOG_RETAIN; граница сохраняется в change_log_floor.
+CHANGE_LOG_RETAIN = 20000
+CHANGE_LOG_COMPACT_EVERY = 1000
+
+
+def _create_change_log_triggers(c):
+    for table, tid_sql, key_sql in CHANGE_LOG_SOURCES:
+        for op, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_{op.lower()}
+                AFTER {op} ON {table}
+                BEGIN
+                    INSERT INTO change_log(table_name, tournament_id, row_key, op)
+                    VALUES('{table}', {tid_sql.format(row=row)}, {key_sql.format(row=row)}, '{op[0]}');
+                END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_change_log_compact
+        AFTER INSERT ON change_log WHEN NEW.seq % {CHANGE_LOG_COMPACT_EVERY} = 0
+        BEGIN
+            DELETE FROM change_log WHERE seq <= NEW.seq - {CHANGE_LOG_RETAIN};
+            UPDATE change_log_floor SET seq = MAX(seq, NEW.seq - {CHANGE_LOG_RETAIN}) WHERE id = 1;
+        END""")
+
+
+def _migration_11_change_log(c):
+    # Журнал изменений для инкрементальных потребителей: «что поменялось после seq X».
+    # AUTOINCREMENT — номера не переиспользуются и после сжатия.
+    c.execute("""CREATE TABLE IF NOT EXISTS change_log(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        tournament_id INTEGER,
+        row_key TEXT NOT NULL,
+        op TEXT NOT NULL CHECK(op IN ('I', 'U', 'D'))
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_change_log_tournament ON change_log(tournament_id, seq)")
+    # Все записи с seq <= floor удалены сжатием
+    c.execute("""CREATE TABLE IF NOT EXISTS change_log_floor(
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        seq INTEGER NOT NULL
+    )""")
+    c.execute("INSERT OR IGNORE INTO change_log_floor(id, seq) VALUES(1, 0)")
+    _create_change_log_triggers(c)
+
+
+# Узел dsq:<tid> — только множество дисквалифицированных турнира: (событие, условие, строка).
+DSQ_NODE_SOURCES = [
+    ("AFTER UPDATE OF disqualified", "COALESCE(OLD.disqualified, 0) != COALESCE(NEW.disqualified, 0)", "NEW"),
+    ("AFTER INSERT", "COALESCE(NEW.disqualified, 0) = 1", "NEW"),
+    ("AFTER DELETE", "COALESCE(OLD.disqualified, 0) = 1", "OLD"),
+]
+
+
+def _migration_12_dsq_node(c):
+    # Версия множества DSQ отдельно от qual:<tid>: ввод результатов её не меняет
+    for event, when, row in DSQ_NODE_SOURCES:
+        name = event.split()[1].lower()
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_nodes_participants_dsq_{name}
+            {event} ON participants WHEN {when}
+            BEGIN
+                INSERT INTO node_versions(node, version) VALUES('dsq:' || {row}.tournament_id, random())
+                ON CONFLICT(node) DO UPDATE SET version = excluded.version;
+            END""")
+
+
+# Общий зачёт пересобирается не целиком, а начиная с блока первого затронутого этапа:
+# блоки идут от финала к первому этапу, затем квалификация (stage_idx = -1), места сквозные,
+# поэтому изменение этапа k меняет только блоки этапов <= k и квалификации.
+# (таблица, событие, SELECT (tid, idx) — турнир и stage_idx первого затронутого блока по NEW/OLD).
+STANDINGS_DIRTY_ALL = 1 << 30
+_PARTICIPANT_LAST_STAGE = """COALESCE((SELECT MAX(s.stage_idx) FROM group_members gm
+    JOIN groups g ON g.id=gm.group_id JOIN stages s ON s.id=g.stage_id WHERE gm.participant_id=NEW.id), -1)"""
+STANDINGS_DIRTY_SOURCES = [
+    ("participants", "INSERT", "SELECT NEW.tournament_id AS tid, -1 AS idx"),
+    ("participants", "DELETE", "SELECT OLD.tournament_id AS tid, -1 AS idx"),
+    # DSQ переносит пилота в конец его блока — последнего этапа, где он состоял в группе
+    ("participants", "UPDATE OF disqualified, start_number",
+     f"""SELECT NEW.tournament_id AS tid, CASE WHEN NEW.start_number IS NOT OLD.start_number
+         THEN {STANDINGS_DIRTY_ALL} ELSE {_PARTICIPANT_LAST_STAGE} END AS idx"""),
+    ("qualification_results", "INSERT", "SELECT NEW.tournament_id AS tid, -1 AS idx"),
+    ("qualification_results", "UPDATE", "SELECT NEW.tournament_id AS tid, -1 AS idx"),
+    ("qualification_results", "DELETE", "SELECT OLD.tournament_id AS tid, -1 AS idx"),
+    ("stages", "INSERT", f"SELECT NEW.tournament_id AS tid, {STANDINGS_DIRTY_ALL} AS idx"),
+    ("stages", "DELETE", f"SELECT OLD.tournament_id AS tid, {STANDINGS_DIRTY_ALL} AS idx"),
+    ("tournaments", "UPDATE OF bracket_json, discipline, scoring_mode",
+     f"SELECT NEW.id AS tid, {STANDINGS_DIRTY_ALL} AS idx"),
+    ("group_standings", "INSERT", "SELECT tournament_id AS tid, stage_idx AS idx FROM stages WHERE id=NEW.stage_id"),
+    ("group_standings", "UPDATE", "SELECT tournament_id AS tid, stage_idx AS idx FROM stages WHERE id=NEW.stage_id"),
+    ("group_standings", "DELETE", "SELECT tournament_id AS tid, stage_idx AS idx FROM stages WHERE id=OLD.stage_id"),
+]
+
+
+def _migration_13_standings_dirty(c):
+    # Вместо очистки всего tournament_standings триггеры отмечают первый затронутый блок;
+    # при чтении пересобираются только он и блоки ниже
+    for table, op, _ in STANDINGS_SOURCES:
+        c.execute(f"DROP TRIGGER IF EXISTS trg_standings_{table}_{op.split()[0].lower()}")
+    if "stage_idx" not in _table_columns(c, "tournament_standings"):
+        c.execute("ALTER TABLE tournament_standings ADD COLUMN stage_idx INTEGER NOT NULL DEFAULT -1")
+    c.execute("""CREATE TABLE IF NOT EXISTS tournament_standings_dirty(
+        tournament_id INTEGER PRIMARY KEY,
+        from_stage_idx INTEGER NOT NULL
+    )""")
+    for table, op, dirty_sql in STANDINGS_DIRTY_SOURCES:
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_standings_dirty_{table}_{op.split()[0].lower()}
+            AFTER {op} ON {table}
+            BEGIN
+                INSERT INTO tournament_standings_dirty(tournament_id, from_stage_idx)
+                SELECT tid, idx FROM ({dirty_sql}) WHERE tid IS NOT NULL
+                ON CONFLICT(tournament_id) DO UPDATE
+                SET from_stage_idx = MAX(from_stage_idx, excluded.from_stage_idx);
+            END""")
+    # Строки без stage_idx пересобираются целиком при первом чтении
+    c.execute("DELETE FROM tournament_standings")
+
+
+# Упорядоченные миграции схемы: (номер версии, функция). Номер пишется в PRAGMA user_version.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_added_columns),
+    (3, _migration_3_qual_attempts),
+    (4, _migration_4_heats_track_no),
+    (5, _migration_5_secondary_indexes),
+    (6, _migration_6_generation_token),
+    (7, _migration_7_group_progress),
+    (8, _migration_8_bracket_json),
+    (9, _migration_9_standings_tables),
+    (10, _migration_10_node_versions),
+    (11, _migration_11_change_log),
+    (12, _migration_12_dsq_node),
+    (13, _migration_13_standings_dirty),
+]
+
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _schema_version(conn) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def init_db():
+    """Доводит схему БД до SCHEMA_VERSION. Если версия актуальна — одно чтение PRAGMA и выход."""
+    with connection() as conn:
+        if _schema_version(conn) >= SCHEMA_VERSION:
+            return
+        # Пересоздание таблиц при включённых FK каскадно удалило бы зависимые строки
+        conn.execute("PRAGMA foreign_keys=OFF")
+        try:
+            with transaction():
+                _run_migrations(conn)
+        finally:
+            conn.execute("PRAGMA foreign_keys=ON")
+
+
+def _run_migrations(conn: sqlite3.Connection):
+    """Применяет недостающие миграции. Вызывается внутри транзакции при foreign_keys=OFF."""
+    version = _schema_version(conn)  # мог обновить другой процесс, пока ждали блокировку
+    c = conn.cursor()
+    for target, migrate in MIGRATIONS:
+        if target > version:
+            migrate(c)
+    violations = c.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f"Миграция схемы нарушила внешние ключи: {violations[:5]}")
+    c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
@@ -0,0 +1,144 @@
+"""Общая итоговая таблица турнира."""
+from typing import List, Optional
+
+import pandas as pd
+
+from .database import (
+    clear_request_memo, exec_many, exec_sql, q_one, q_rows, q_scalar, qdf, transaction
+)
+from .i18n import translate
+from .qualification import format_time, get_disqualified_pids, get_qual_ranking, get_tournament
+from .playoff import get_all_stages, get_bracket_for_tournament, get_group_standings
+from .schema import STANDINGS_DIRTY_ALL
+
+
+def compute_overall_standings(tournament_id: int, dsq_label: Optional[str] = None) -> pd.DataFrame:
+    """Общая итоговая таблица турнира из tournament_standings. dsq_label — подпись для
+    дисквалифицированных (по умолчанию русская). Блоки, отмеченные триггерами, пересобираются."""
+    if dsq_label is None:
+        dsq_label = translate("disqualified_full")
+    if q_scalar("""SELECT 1 FROM tournaments t WHERE t.id=?
+                   AND (EXISTS(SELECT 1 FROM tournament_standings_dirty d WHERE d.tournament_id=t.id)
+                        OR NOT EXISTS(SELECT 1 FROM tournament_standings s WHERE s.tournament_id=t.id))""",
+                (tournament_id,)):
+        refresh_tournament_standings(tournament_id)
+    return qdf("""
+        SELECT ts.place, ts.participant_id as pid, p.name, ts.stage,
+               CASE WHEN ts.is_dsq THEN ? ELSE ts.detail END as detail
+        FROM tournament_standings ts
+        JOIN participants p ON p.id=ts.participant_id
+        WHERE ts.tournament_id=?
+        ORDER BY ts.place
+    """, (dsq_label, tournament_id))
+
+
+def refresh_tournament_standings(tournament_id: int):
+    """Пересобирает tournament_standings турнира из group_standings и квалификации,
+    начиная с блока, отмеченного в tournament_standings_dirty (пустая таблица — целиком).
+
+    Логика распределения мест:
+    1. Финалисты: места 1-4 из итогов финала
+    2. Проигравшие полуфинала: места 5-8 (ранжированы внутри)
+    3. Проигравшие четвертьфинала: места 9-16
+    4. Проигравшие 1/8: места 17-32
+    5. Не прошедшие квалификацию: следующие места
+    Дисквалифицированные — в конце блока своего этапа.
+
+    Всё читается и пишется в одной транзакции под блокировкой записи: запись другой сессии
+    не попадёт между чтением и сохранением, а значения из кэшей, взятые до блокировки,
+    не используются (общий кэш внутри транзакции обходится).
+    """
+    with transaction():
+        clear_request_memo()
+        from_idx = q_scalar("SELECT from_stage_idx FROM tournament_standings_dirty WHERE tournament_id=?",
+                            (tournament_id,))
+        if from_idx is None:
+            if q_scalar("SELECT 1 FROM tournament_standings WHERE tournament_id=? LIMIT 1", (tournament_id,)):
+                return  # уже пересобрала другая сессия
+            from_idx = STANDINGS_DIRTY_ALL
+        from_idx = int(from_idx)
+        kept = q_one("""SELECT COUNT(*) AS n, COALESCE(MAX(place), 0) AS last FROM tournament_standings
+                        WHERE tournament_id=? AND stage_idx > ?""", (tournament_id, from_idx))
+        if kept["n"] != kept["last"]:
+            from_idx = STANDINGS_DIRTY_ALL  # места верхних блоков не сплошные — пересобираем всё
+        rows = _build_standings_rows(tournament_id, from_idx)
+        exec_sql("DELETE FROM tournament_standings WHERE tournament_id=? AND stage_idx <= ?", (tournament_id, from_idx))
+        exec_many("""INSERT INTO tournament_standings(tournament_id, place, participant_id, stage, detail, is_dsq,
+                                                      stage_idx) VALUES(?,?,?,?,?,?,?)""", rows)
+        # Сброс отметки — последним: её могли поставить досчёт групп при чтении выше
+        exec_sql("DELETE FROM tournament_standings_dirty WHERE tournament_id=?", (tournament_id,))
+
+
+def _build_standings_rows(tournament_id: int, from_idx: int) -> List[tuple]:
+    """Строки блоков этапов с stage_idx <= from_idx и квалификации. Блоки выше берутся
+    из tournament_standings как есть: их места и пилоты от нижних этапов не зависят."""
+    tourn = get_tournament(tournament_id)
+    if tourn is None:
+        return []
+    is_sim_ov = str(tourn["discipline"]) in ("sim_individual", "sim_team")
+
+    kept = q_rows("""SELECT participant_id FROM tournament_standings
+                     WHERE tournament_id=? AND stage_idx > ? ORDER BY place""", (tournament_id, from_idx))
+    placed_pids = {int(r["participant_id"]) for r in kept}
+    bracket = get_bracket_for_tournament(tournament_id)
+    all_stages = get_all_stages(tournament_id)
+    dsq_pids = get_disqualified_pids(tournament_id)
+
+    blocks = []  # [(stage_idx, этап, [(pid, detail)])] в порядке мест
+    if bracket and not all_stages.empty:
+        # Проходим этапы с конца (финал → ... → первый этап), начиная с отмеченного
+        for sidx in range(min(len(bracket) - 1, from_idx), -1, -1):
+            sd = bracket[sidx]
+            srow = all_stages[all_stages["stage_idx"] == sidx]
+            if srow.empty:
+                continue
+            stage_id = int(srow.iloc[0]["id"])
+            sname = sd.display_name.get("ru", sd.code)
+            standings = get_group_standings(stage_id)
+
+            if sd.code == "F":
+                # Финалисты — из итогов финала
+                fin = standings.get(1, pd.DataFrame())
+                block = []
+                for r in fin.to_dict("records"):
+                    if is_sim_ov:
+                        detail = f"{int(r['total_points'])} оч."
+                    else:
+                        detail = f"{int(r['total_points'])} оч. ({int(r['wins'])} поб.)"
+                    block.append((int(r["participant_id"]), detail))
+            else:
+                # Не финальный этап: выбывшие из групп
+                eliminated = []
+                for gno in sorted(standings):
+                    for r in standings[gno].to_dict("records"):
+                        pid = int(r["participant_id"])
+                        if pid in placed_pids:
+                            continue
+                        if is_sim_ov and int(r["rank"]) > sd.qualifiers:
+                            eliminated.append((-int(r["total_points"]), pid, f"{int(r['total_points'])} оч."))
+                        elif not is_sim_ov and int(r["heat_place"]) > sd.qualifiers:
+                            t = r["projected_time"] or r["time_seconds"]
+                            eliminated.append((t if t else 9999, pid, format_time(t)))
+                # Для сима — по очкам DESC, для дронов — по времени ASC (сортировка устойчивая)
+                eliminated.sort(key=lambda e: e[0])
+                block = [(pid, detail) for _, pid, detail in eliminated]
+            blocks.append((sidx, sname, block))
+            placed_pids.update(pid for pid, _ in block)
+
+    # Не прошедшие квалификацию
+    block = []
+    for r in get_qual_ranking(tournament_id).to_dict("records"):
+        pid = int(r["pid"])
+        if pid not in placed_pids:
+            t = r["projected_time"] or r["time_seconds"]
+            block.append((pid, format_time(t) if t and pd.notna(t) else "—"))
+            placed_pids.add(pid)
+    blocks.append((-1, "Квалификация", block))
+
+    # Дисквалифицированные — в конец каждого блока этапа, места сквозные
+    rows = []
+    for sidx, sname, block in blocks:
+        ordered = [e for e in block if e[0] not in dsq_pids] + [e for e in block if e[0] in dsq_pids]
+        for pid, detail in ordered:
+            rows.append((tournament_id, len(kept) + len(rows) + 1, pid, sname, detail, int(pid in dsq_pids), sidx))
+    return rows
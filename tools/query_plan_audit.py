@@ -0,0 +1,185 @@
+"""Аудит планов запросов: прогоняет EXPLAIN QUERY PLAN по всем SQL-строкам app.py и пакета fpv_tournament.
+
+Использование:
+    python tools/query_plan_audit.py [путь_к_БД] [--all]
+
+Без пути берётся tournament.db в корне репозитория; если файла нет — код возврата 2.
+БД открывается только на чтение; схема должна быть актуальной (хотя бы один запуск
+приложения). Параметры `?` подставляются как NULL — план от значений не зависит. Полные
+сканы таблиц (`SCAN <table>` без индекса) выводятся с пометкой, код возврата 1, если они есть.
+Сканы таблиц из EXPECTED_SCANS (список всех турниров, служебные таблицы SQLite) не считаются.
+
+SQL в f-строках проверяется во всех вариантах: подстановки-переменные, которым в функции
+присваиваются только строковые литералы (в т.ч. через `a if cond else b`), перебираются,
+`",".join("?" * n)` заменяется одним `?`. Литералы, план которых построить нельзя
+(именованные поля шаблонов, присоединённая БД, тела триггеров, прочие подстановки),
+выводятся списком «пропущено» с файлом и строкой.
+"""
+import ast
+import glob
+import itertools
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = [os.path.join(ROOT, "app.py")] + sorted(glob.glob(os.path.join(ROOT, "fpv_tournament", "*.py")))
+
+SQL_START = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b.*\b(FROM|INTO|SET)\b",
+                       re.IGNORECASE | re.DOTALL)
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?! USING)")
+# Миграции работают с временными *_new таблицами и sqlite_master, сжатие журнала
+# изменений — со всей таблицей change_log; их не проверяем
+SKIP_FUNCS = ("init_db", "_migration_", "compact_change_log")
+# Таблицы, которые читаются целиком по смыслу запроса
+EXPECTED_SCANS = {"tournaments", "sqlite_master", "sqlite_sequence"}
+# Шаблоны с именованными полями ({table}, {ids}) и запросы к присоединённой БД src
+# собираются/выполняются только во время слияния, тела триггеров (NEW./OLD.) — только
+# внутри триггера; их план здесь не построить
+DYNAMIC_SQL = re.compile(r"\{\w+\}|\bsrc\.|\b(NEW|OLD)\.")
+# Имена CTE (WITH name AS (...)): их сканы — обход промежуточного результата, а не таблицы
+CTE_NAME = re.compile(r"\b(\w+)\s+AS\s*\(", re.IGNORECASE)
+
+
+def _assigned_strings(func: ast.AST) -> Dict[str, List[ast.expr]]:
+    """Имя → выражения, которые ему присваиваются в функции (только простые `name = ...`)."""
+    assigns: Dict[str, List[ast.expr]] = {}
+    for node in ast.walk(func):
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            assigns.setdefault(node.targets[0].id, []).append(node.value)
+    return assigns
+
+
+def _string_values(expr: ast.expr, assigns: Dict[str, List[ast.expr]]) -> Optional[List[str]]:
+    """Все строковые значения выражения подстановки; None — значения статически не известны."""
+    if isinstance(expr, ast.Constant) and isinstance(expr.value, str):
+        return [expr.value]
+    if isinstance(expr, ast.IfExp):
+        body, orelse = _string_values(expr.body, assigns), _string_values(expr.orelse, assigns)
+        return body + orelse if body is not None and orelse is not None else None
+    if isinstance(expr, ast.Name) and expr.id in assigns:
+        values: List[str] = []
+        for value in assigns[expr.id]:
+            found = _string_values(value, assigns)
+            if found is None:
+                return None
+            values.extend(found)
+        return values
+    # ",".join("?" * n) — список плейсхолдеров, одного "?" достаточно
+    if (isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and expr.func.attr == "join"
+            and isinstance(expr.func.value, ast.Constant) and "?" in ast.unparse(expr)):
+        return ["?"]
+    return None
+
+
+def _render_fstring(node: ast.JoinedStr, assigns: Dict[str, List[ast.expr]]) -> Optional[List[str]]:
+    """Все варианты текста f-строки; None — есть подстановка с неизвестным значением."""
+    parts: List[List[str]] = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append([value.value])
+            continue
+        if not isinstance(value, ast.FormattedValue) or value.format_spec is not None:
+            return None
+        found = _string_values(value.value, assigns)
+        if found is None:
+            return None
+        parts.append(sorted(set(found)))
+    return ["".join(combo) for combo in itertools.product(*parts)]
+
+
+def extract_sql(path: str) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str, str]]]:
+    """Строковые литералы и f-строки, похожие на DML, с номерами строк: (проверяемые,
+    пропущенные с причиной)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    skipped_funcs: Dict[int, str] = {}
+    scopes: Dict[int, Dict[str, List[ast.expr]]] = {}
+    for func in ast.walk(tree):
+        if isinstance(func, ast.FunctionDef):
+            assigns = _assigned_strings(func)
+            for node in ast.walk(func):
+                scopes[id(node)] = assigns
+                if func.name.startswith(SKIP_FUNCS):
+                    skipped_funcs[id(node)] = func.name
+    # Части f-строк проверяются в составе всей строки
+    fragments = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for part in node.values}
+    found, skipped = [], []
+    for node in ast.walk(tree):
+        if id(node) in fragments:
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            texts: Optional[List[str]] = [node.value]
+            sample = node.value
+        elif isinstance(node, ast.JoinedStr):
+            texts = _render_fstring(node, scopes.get(id(node), {}))
+            sample = texts[0] if texts else "".join(
+                v.value if isinstance(v, ast.Constant) else "{...}" for v in node.values)
+        else:
+            continue
+        if not SQL_START.match(sample):
+            continue
+        if id(node) in skipped_funcs:
+            skipped.append((node.lineno, f"функция {skipped_funcs[id(node)]}", sample))
+        elif texts is None:
+            skipped.append((node.lineno, "подстановка f-строки", sample))
+        elif DYNAMIC_SQL.search(sample):
+            skipped.append((node.lineno, "шаблон / src / триггер", sample))
+        else:
+            # "IN ({})" заполняется через .format(",".join("?" * n)) — одного "?" достаточно
+            found.extend((node.lineno, text.replace("{}", "?")) for text in texts)
+    return sorted(found), sorted(skipped)
+
+
+def explain(conn, sql: str) -> List[str]:
+    params = [None] * sql.count("?")
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[3] for row in rows]
+
+
+def main(argv: List[str]) -> int:
+    show_all = "--all" in argv
+    args = [a for a in argv if not a.startswith("--")]
+    db_path = args[0] if args else os.path.join(ROOT, "tournament.db")
+    if not os.path.exists(db_path):
+        print(f"БД не найдена: {db_path}\n"
+              "Использование: python tools/query_plan_audit.py [путь_к_БД] [--all]", file=sys.stderr)
+        return 2
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+    flagged = 0
+    found, skipped = [], []
+    for path in SOURCES:
+        checked, missed = extract_sql(path)
+        rel = os.path.relpath(path, ROOT)
+        found.extend((rel, lineno, sql) for lineno, sql in checked)
+        skipped.extend((rel, lineno, reason, sql) for lineno, reason, sql in missed)
+    for path, lineno, sql in found:
+        one_line = " ".join(sql.split())
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error as e:
+            print(f"{path}:{lineno}: ОШИБКА {e}\n    {one_line}")
+            continue
+        ignored = EXPECTED_SCANS | set(CTE_NAME.findall(sql))
+        scans = [step for step in plan
+                 if FULL_SCAN.match(step) and FULL_SCAN.match(step).group(1) not in ignored]
+        if scans:
+            flagged += 1
+        if scans or show_all:
+            mark = "SCAN" if scans else "ok"
+            print(f"{path}:{lineno}: [{mark}] {one_line}")
+            for step in plan:
+                print(f"    {step}")
+    if skipped:
+        print(f"\nПропущено (план не построить): {len(skipped)}")
+        for path, lineno, reason, sql in skipped:
+            print(f"  {path}:{lineno}: [{reason}] {' '.join(sql.split())[:100]}")
+    print(f"\nПроверено запросов: {len(found)}, с полным сканом: {flagged}")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))